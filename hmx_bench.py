@@ -0,0 +1,486 @@
+# Synthetic milo generator and parse/build benchmark for io_import_hmx, no Blender needed.
+#
+#   python hmx_bench.py                      benchmark every case, JSON on stdout
+#   python hmx_bench.py --out bench.json     same, into a file
+#   python hmx_bench.py --write-milos DIR    also write a synthetic milo per case to import by hand
+#
+# Every Mesh/Tex/Trans/TransAnim version and platform branch io_import_hmx reads gets an entry
+# generated here. Parse stages time the read_* functions, build stages run the build_* functions
+# against a stand-in bpy, so they only measure the importer's own side of building.
+
+import os
+import sys
+import json
+import time
+import zlib
+import struct
+import argparse
+import platform
+import tempfile
+import contextlib
+import numpy as np
+
+import io_import_hmx as hmx
+
+class Writer:
+    def __init__(self, endian):
+        self.endian = endian
+        self.data = bytearray()
+
+    def pad(self, count):
+        self.data += bytes(count)
+
+    def pad_to(self, offset):
+        self.data += bytes(offset - len(self.data))
+
+    def int(self, value):
+        self.data += struct.pack(self.endian + 'I', value)
+
+    def floats(self, values):
+        self.data += struct.pack(self.endian + '%df' % len(values), *values)
+
+    def string(self, value):
+        self.int(len(value))
+        self.data += value.encode('utf-8')
+
+    def byte(self, value):
+        self.data.append(value)
+
+    def raw(self, data):
+        self.data += data
+
+IDENTITY = (1, 0, 0, 0, 1, 0, 0, 0, 1, 0, 0, 0)
+
+# (endian, version, platform extension, vertex layout)
+MESH_CASES = [
+    ('<', 25, '.rnd', hmx.LE_VERTS),
+    ('<', 28, '.milo_ps2', hmx.LE_VERTS),
+    ('<', 28, '.milo_xbox', hmx.LE_VERTS),
+    ('<', 34, '.milo_xbox', hmx.LE_VERTS_34),
+    ('<', 34, '.milo_xbox', hmx.LE_VERTS_34_W),
+    ('>', 34, '.milo_xbox', hmx.BE_VERTS_34_XBOX),
+    ('>', 36, '.milo_wii', hmx.BE_VERTS_WII),
+    ('>', 36, '.milo_ps3', hmx.BE_VERTS_PS3),
+    ('>', 36, '.milo_xbox', hmx.BE_VERTS_XBOX),
+    ('>', 37, '.milo_wii', hmx.BE_VERTS_WII),
+    ('>', 37, '.milo_ps3', hmx.BE_VERTS_PS3),
+    ('>', 37, '.milo_xbox', hmx.BE_VERTS_XBOX),
+    ('>', 38, '.milo_ps3', hmx.BE_VERTS_38_PS3),
+    ('>', 38, '.milo_xbox', hmx.BE_VERTS_38_XBOX),
+    ('>', 38, '.milo_wii', hmx.BE_VERTS_38),
+]
+# (endian, version, platform extension)
+TEX_CASES = [('<', 10, '.milo_xbox'), ('>', 10, '.milo_ps3'), ('>', 11, '.milo_ps3'), ('>', 11, '.milo_xbox')]
+TRANS_CASES = [('<', 8, '.rnd'), ('<', 9, '.milo_xbox'), ('<', 9, '.milo_ps2'), ('>', 9, '.milo_ps3')]
+TRANS_ANIM_CASES = [('<', 4, '.rnd'), ('<', 6, '.milo_xbox'), ('<', 6, '.milo_ps2'), ('>', 7, '.milo_ps3')]
+
+def case_name(endian, version, ext, layout=None):
+    name = "%s v%d %s" % ('LE' if endian == '<' else 'BE', version, ext)
+    if layout is hmx.LE_VERTS_34_W:
+        name += " xyzw"
+    return name
+
+def settings_for(endian, ext):
+    return hmx.ImportSettings("bench" + ext, low_lod_setting=False, shadow_setting=False,
+                              little_endian_setting=endian == '<')
+
+def vertex_block(layout, verts, bones, rng):
+    data = np.zeros(verts, dtype=layout)
+    data['pos'] = rng.uniform(-100, 100, (verts, 3))
+    data['uv'] = rng.uniform(0, 1, (verts, 2))
+    for name in layout.names:
+        if name == 'normal':
+            data[name] = rng.uniform(-1, 1, (verts, 3))
+        elif name in ('packed_normal', 'packed_weights'):
+            data[name] = rng.integers(0, 1 << 32, verts, dtype=np.uint64)
+        elif name == 'weights':
+            if layout[name].base == np.uint8:
+                data[name] = rng.integers(0, 256, (verts, 4))
+            else:
+                data[name] = rng.uniform(0, 1, (verts, 4))
+        elif name == 'bones':
+            data[name] = rng.integers(0, bones, (verts, 4))
+    return data.tobytes()
+
+def mesh_entry(endian, version, ext, layout, verts, faces, bones, rng):
+    w = Writer(endian)
+    w.int(version)
+    LE = endian == '<'
+    if LE and version == 25:
+        w.pad_to(8)
+    elif LE and version == 28 and ext == '.milo_ps2':
+        w.pad_to(17)
+    else:
+        w.pad_to(21)
+    w.floats(IDENTITY)
+    w.floats(IDENTITY)
+    if LE and version == 25:
+        w.int(0)
+    w.pad(4)
+    w.string("bench.trans")
+    w.pad(1)
+    w.string("bench_parent.mesh")
+    if LE and version == 25:
+        w.pad(5)
+        w.int(0)
+        w.pad(16)
+    elif not LE and version == 37:
+        w.pad(29)
+    else:
+        w.pad(25)
+    w.string("bench.mat")
+    w.string("bench_geom")
+    w.pad(9)
+    w.int(verts)
+    if not LE and version > 34:
+        if layout is hmx.BE_VERTS_38:
+            w.byte(1)
+            w.int(layout.itemsize)
+            w.pad(4)
+        else:
+            w.byte(0)
+    if 'bones' not in layout.names:
+        bones = 4
+    w.raw(vertex_block(layout, verts, bones, rng))
+    w.int(faces)
+    w.raw(rng.integers(0, verts, faces * 3).astype(endian + 'u2').tobytes())
+    w.int(faces // 100 + 1)
+    w.pad(faces // 100 + 1)
+    if LE and version < 34:
+        for x in range(4):
+            w.string("bone_%d.mesh" % x)
+    else:
+        w.int(bones)
+        for x in range(bones):
+            w.string("bone_%d.mesh" % x)
+            w.floats(IDENTITY)
+    return bytes(w.data), bones
+
+def tex_entry(endian, version, size):
+    w = Writer(endian)
+    w.int(version)
+    w.pad_to(18 if version == 11 else 17)
+    w.int(size)
+    w.int(size)
+    if version == 11:
+        # bpp
+        w.int(4)
+    w.pad_to(30 if version == 11 else 29)
+    w.string("bench.bmp")
+    w.pad(11)
+    # DXT1
+    w.int(8)
+    w.byte(1)
+    w.pad(25)
+    w.raw(bytes(size * size // 2))
+    return bytes(w.data)
+
+def trans_entry(endian, version, ext, name, parent):
+    w = Writer(endian)
+    w.int(version)
+    if endian == '<' and version == 8:
+        w.pad_to(8)
+    else:
+        w.pad_to(17)
+    w.floats(IDENTITY)
+    w.floats(IDENTITY)
+    if endian == '<' and version == 8:
+        w.int(0)
+    w.pad_to(113 if endian == '<' and ext == '.milo_ps2' else 117)
+    w.string(name)
+    w.pad(1)
+    w.string(parent)
+    return bytes(w.data)
+
+def bone_mesh_entry(name, parent):
+    w = Writer('>')
+    w.int(25)
+    w.pad_to(21)
+    w.floats(IDENTITY)
+    w.floats(IDENTITY)
+    w.pad_to(117)
+    w.string(name)
+    w.pad(1)
+    w.string(parent)
+    return bytes(w.data)
+
+def keys(w, width, count, rng):
+    w.int(count)
+    values = rng.uniform(-1, 1, (count, width)).astype(np.float32)
+    values[:, -1] = np.arange(count)
+    w.raw(values.astype(w.endian + 'f4').tobytes())
+
+def trans_anim_entry(endian, version, ext, count, rng):
+    w = Writer(endian)
+    w.int(version)
+    if endian == '<' and version == 4:
+        w.pad_to(8)
+        w.int(0)
+        w.int(0)
+        w.pad(25)
+    else:
+        w.pad_to(25 if ext == '.milo_ps2' else 29)
+    w.string("bench.trans")
+    keys(w, 5, count, rng)
+    keys(w, 4, count, rng)
+    w.string("bench.tnm")
+    w.pad(2)
+    keys(w, 4, count, rng)
+    return bytes(w.data)
+
+def prop_anim_entry(count, rng):
+    w = Writer('>')
+    w.int(11)
+    w.pad_to(29)
+    w.int(2)
+    for prop, keys_type, width in (("position", 5, 3), ("alpha", 0, 1)):
+        w.int(keys_type)
+        w.pad(4)
+        w.string("bench.trans")
+        w.pad(1)
+        w.raw(struct.pack('>H', 1))
+        w.int(0)
+        w.int(5)
+        w.string(prop)
+        w.pad(12)
+        keys(w, width + 1, count, rng)
+    return bytes(w.data)
+
+def char_clip_entry(bones, samples, rng):
+    w = Writer('>')
+    w.int(16)
+    w.pad(8)
+    w.string("bench")
+    w.pad(59)
+    w.int(bones * 2)
+    for x in range(bones):
+        w.string("bone_%d.pos" % x)
+        w.pad(4)
+        w.string("bone_%d.quat" % x)
+        w.pad(4)
+    w.pad(28 + 4)
+    w.int(samples)
+    w.int(samples)
+    w.floats(range(samples))
+    w.raw(rng.integers(-32767, 32768, samples * bones * 7).astype('>i2').tobytes())
+    return bytes(w.data)
+
+def milo_file(endian, entries, compressed=False):
+    # entries are (type, name, bytes). BE directories are written as version 25 so every
+    # entry gets read, LE ones as version 24 with an empty ObjectDir body in front
+    w = Writer(endian)
+    w.int(25 if endian == '>' else 24)
+    w.string("ObjectDir")
+    w.string("bench")
+    w.pad(8)
+    w.int(len(entries))
+    for directory, name, data in entries:
+        w.string(directory)
+        w.string(name)
+    if endian == '<':
+        w.raw(hmx.ENTRY_END)
+    for directory, name, data in entries:
+        w.raw(data)
+        w.raw(hmx.ENTRY_END)
+    body = bytes(w.data)
+    StartOffset = 2048
+    if compressed:
+        blocks = []
+        for pos in range(0, len(body), 0x10000):
+            packer = zlib.compressobj(6, zlib.DEFLATED, -15)
+            blocks.append(packer.compress(body[pos:pos + 0x10000]) + packer.flush())
+        Magic = hmx.MILO_ZLIB
+    else:
+        blocks = [body]
+        Magic = hmx.MILO_UNCOMPRESSED
+    # the largest block once inflated, what the game sizes its inflate buffer by
+    header = struct.pack('<4I', Magic, StartOffset, len(blocks), min(len(body), 0x10000) if compressed else len(body))
+    header += struct.pack('<%dI' % len(blocks), *(len(block) for block in blocks))
+    return header.ljust(StartOffset, b'\0') + b''.join(blocks)
+
+class StandIn:
+    # stand-in for bpy and mathutils: every attribute, call and item is another StandIn, except
+    # lookups by name find nothing and foreach_set copies its input like RNA would
+    def __getattr__(self, name):
+        return StandIn()
+
+    def __call__(self, *args, **kwargs):
+        return StandIn()
+
+    def __getitem__(self, key):
+        return StandIn()
+
+    def __setitem__(self, key, value):
+        pass
+
+    def __iter__(self):
+        return iter(())
+
+    def __len__(self):
+        return 0
+
+    def find(self, *args, **kwargs):
+        return None
+
+    def foreach_set(self, attr, seq):
+        np.array(seq, copy=True)
+
+    def foreach_get(self, attr, seq):
+        pass
+
+def check(case, what, got, expected):
+    # a branch that stopped parsing right shouldn't just report a nice number
+    if got != expected:
+        raise SystemExit("%s: read %d %s, expected %d" % (case, got, what, expected))
+
+def timed(repeat, func):
+    # best of repeat, prints of the importer go nowhere
+    best = None
+    with open(os.devnull, 'w') as null, contextlib.redirect_stdout(null):
+        for x in range(repeat):
+            start = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def rates(seconds, **counts):
+    out = {"seconds": seconds}
+    for name, count in counts.items():
+        out[name + "_per_s"] = count / seconds if seconds > 0 else None
+    return out
+
+def bench_meshes(args, rng, results, milos):
+    for endian, version, ext, layout in MESH_CASES:
+        data, bones = mesh_entry(endian, version, ext, layout, args.verts, args.faces, args.bones, rng)
+        settings = settings_for(endian, ext)
+        basename = "bench" + ext
+        seconds, mesh = timed(args.repeat, lambda: hmx.read_mesh(settings, "bench.mesh", memoryview(data), basename))
+        check(case_name(endian, version, ext, layout), "verts", len(mesh.verts), args.verts)
+        check(case_name(endian, version, ext, layout), "faces", len(mesh.faces), args.faces)
+        build, x = timed(args.repeat, lambda: hmx.build_mesh(settings, None, mesh, basename, hmx.MaterialRegistry(settings)))
+        results.append({"stage": "mesh", "case": case_name(endian, version, ext, layout),
+                        "parse": rates(seconds, verts=args.verts, faces=args.faces, mb=len(data) / 1e6),
+                        "build": rates(build, verts=args.verts, faces=args.faces)})
+        milos.setdefault((endian, ext), []).append(("Mesh", "%s.mesh" % case_name(endian, version, ext, layout).replace(' ', '_'), data))
+
+def bench_textures(args, rng, results, milos):
+    folder = tempfile.mkdtemp(prefix="hmx_bench")
+    for endian, version, ext in TEX_CASES:
+        data = tex_entry(endian, version, args.tex_size)
+        settings = settings_for(endian, ext)
+        settings.filepath = os.path.join(folder, "bench" + ext)
+        # a new name each time so Tex never skips an already written .dds
+        names = ("t%d.tex" % x for x in range(args.repeat))
+        seconds, digest = timed(args.repeat, lambda: hmx.Tex("bench" + ext, settings, next(names), memoryview(data)))
+        results.append({"stage": "tex", "case": case_name(endian, version, ext),
+                        "parse": rates(seconds, textures=1, mb=len(data) / 1e6)})
+        milos.setdefault((endian, ext), []).append(("Tex", "%s.tex" % case_name(endian, version, ext).replace(' ', '_'), data))
+    for name in os.listdir(folder):
+        os.remove(os.path.join(folder, name))
+    os.rmdir(folder)
+
+def bench_bones(args, rng, results, milos):
+    for endian, version, ext in TRANS_CASES:
+        entries = [trans_entry(endian, version, ext, "bone_%d.mesh" % x, "bone_%d.mesh" % (x - 1)) for x in range(args.bones)]
+        settings = settings_for(endian, ext)
+        seconds, trans = timed(args.repeat, lambda: [hmx.read_trans(settings, "bone_%d.mesh" % x, entry, "bench" + ext)
+                                                    for x, entry in enumerate(entries)])
+        check(case_name(endian, version, ext), "bone parents", sum(data.parent.startswith("bone_") for data in trans), args.bones)
+        def build():
+            armature = hmx.ArmatureBuilder()
+            for data in trans:
+                armature.add(data)
+            armature.build()
+        build_seconds, x = timed(args.repeat, build)
+        results.append({"stage": "trans", "case": case_name(endian, version, ext),
+                        "parse": rates(seconds, bones=args.bones), "build": rates(build_seconds, bones=args.bones)})
+        milos.setdefault((endian, ext), []).extend(("Trans", "bone_%d.mesh" % x, entry) for x, entry in enumerate(entries))
+    entries = [bone_mesh_entry("bone_%d.mesh" % x, "bone_%d.mesh" % (x - 1)) for x in range(args.bones)]
+    seconds, x = timed(args.repeat, lambda: [hmx.read_mesh_trans("bone_%d.mesh" % x, entry) for x, entry in enumerate(entries)])
+    results.append({"stage": "trans", "case": "BE bone meshes", "parse": rates(seconds, bones=args.bones)})
+
+def bench_keys(args, rng, results, milos):
+    for endian, version, ext in TRANS_ANIM_CASES:
+        data = trans_anim_entry(endian, version, ext, args.keys, rng)
+        settings = settings_for(endian, ext)
+        seconds, anim = timed(args.repeat, lambda: hmx.read_trans_anim(settings, "bench.tnm", memoryview(data), "bench" + ext))
+        check(case_name(endian, version, ext), "scale keys", len(anim.scale_keys), args.keys)
+        build, x = timed(args.repeat, lambda: hmx.build_trans_anim(anim))
+        results.append({"stage": "keys", "case": "TransAnim " + case_name(endian, version, ext),
+                        "parse": rates(seconds, keys=3 * args.keys), "build": rates(build, keys=3 * args.keys)})
+        milos.setdefault((endian, ext), []).append(("TransAnim", "%s.tnm" % case_name(endian, version, ext).replace(' ', '_'), data))
+    data = prop_anim_entry(args.keys, rng)
+    seconds, tracks = timed(args.repeat, lambda: hmx.read_prop_anim(memoryview(data)))
+    check("PropAnim", "tracks", len(tracks), 2)
+    build, x = timed(args.repeat, lambda: [hmx.build_prop_anim(track) for track in tracks])
+    results.append({"stage": "keys", "case": "PropAnim BE v11",
+                    "parse": rates(seconds, keys=2 * args.keys), "build": rates(build, keys=2 * args.keys)})
+    milos.setdefault(('>', '.milo_ps3'), []).append(("PropAnim", "bench.anim", data))
+    data = char_clip_entry(args.bones, args.keys, rng)
+    seconds, clip = timed(args.repeat, lambda: hmx.read_char_clip(data))
+    build, x = timed(args.repeat, lambda: hmx.build_char_clip(clip))
+    samples = args.bones * 2 * args.keys
+    results.append({"stage": "keys", "case": "CharClipSamples v16",
+                    "parse": rates(seconds, keys=samples, mb=len(data) / 1e6), "build": rates(build, keys=samples)})
+
+def bench_milos(args, results, milos, folder):
+    for (endian, ext), entries in sorted(milos.items()):
+        for compressed in (False, True):
+            data = milo_file(endian, entries, compressed)
+            name = "bench_%s%s%s" % ('le' if endian == '<' else 'be', '_zlib' if compressed else '', ext)
+            path = os.path.join(folder, name)
+            with open(path, 'wb') as out:
+                out.write(data)
+            settings = settings_for(endian, ext)
+            settings.filepath = path
+            seconds, parsed = timed(args.repeat, lambda: hmx.read_milo(settings))
+            results.append({"stage": "milo", "case": name,
+                            "parse": rates(seconds, entries=len(parsed), mb=len(data) / 1e6)})
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark io_import_hmx on synthetic milos")
+    parser.add_argument("--verts", type=int, default=20000)
+    parser.add_argument("--faces", type=int, default=30000)
+    parser.add_argument("--bones", type=int, default=150)
+    parser.add_argument("--keys", type=int, default=2000)
+    parser.add_argument("--tex-size", type=int, default=1024, help="texture width and height")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per case, the best one is reported")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the JSON here instead of stdout")
+    parser.add_argument("--write-milos", metavar="DIR", help="keep the generated milos in this folder")
+    args = parser.parse_args(argv)
+    if hmx.bpy is None:
+        hmx.bpy = StandIn()
+        hmx.mathutils = StandIn()
+    rng = np.random.default_rng(args.seed)
+    results = []
+    milos = {}
+    bench_meshes(args, rng, results, milos)
+    bench_textures(args, rng, results, milos)
+    bench_bones(args, rng, results, milos)
+    bench_keys(args, rng, results, milos)
+    if args.write_milos:
+        os.makedirs(args.write_milos, exist_ok=True)
+        bench_milos(args, results, milos, args.write_milos)
+    else:
+        with tempfile.TemporaryDirectory(prefix="hmx_bench") as folder:
+            bench_milos(args, results, milos, folder)
+    report = {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "parser_version": hmx.PARSER_VERSION,
+        "params": {key: value for key, value in vars(args).items() if key not in ("out", "write_milos")},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as out:
+            out.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -12,18 +12,47 @@ bl_info = {
     "category": "Import-Export",
 }
 
-import bpy
 import zlib
+import re
+import hashlib
 import struct
 import math
-import mathutils
 import io
 import os
+import sys
+import json
+import argparse
+import mmap
+import time
+import threading
 import numpy as np
-
-from bpy_extras.io_utils import ImportHelper
-from bpy.props import StringProperty, BoolProperty, EnumProperty
-from bpy.types import Operator
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import dataclasses
+from dataclasses import dataclass
+
+try:
+    import bpy
+    import mathutils
+    from bpy_extras.io_utils import ImportHelper
+    from bpy.props import StringProperty, BoolProperty, EnumProperty, CollectionProperty, IntProperty
+    from bpy.types import Operator, OperatorFileListElement, PropertyGroup, UIList
+except ImportError:
+    # Outside of Blender only the read_* side of this file can be used
+    bpy = mathutils = None
+    class Operator:
+        pass
+    class ImportHelper:
+        pass
+    class PropertyGroup:
+        pass
+    class UIList:
+        pass
+    def StringProperty(**kwargs):
+        return None
+    BoolProperty = EnumProperty = CollectionProperty = IntProperty = StringProperty
+    OperatorFileListElement = None
 
 def l_int(f):
     return struct.unpack('I', f.read(4))[0]
@@ -52,25 +81,453 @@ def b_numstring(f):
     name_len = struct.unpack('>I', f.read(4))[0]
     string = f.read(name_len).decode('utf-8')
     return string
-    
-
-class ImportMilo(Operator, ImportHelper):
-    """This appears in the tooltip of the operator and in the generated docs"""
-    bl_idname = "import.milo"
-    bl_label = "Import Milo"
-
-    filepath = StringProperty(subtype='FILE_PATH')
 
-    filename_ext = ".milo_ps3"
+# Set HMX_DEBUG=1 for the per entry prints, without it debug() returns straight away
+DEBUG = bool(os.environ.get("HMX_DEBUG"))
+
+def debug(*args):
+    if DEBUG:
+        print(*args)
+
+class Stage:
+    # One timed stage, counters can be added while it runs
+    __slots__ = ('profile', 'name', 'counts', 'start')
+
+    def __init__(self, profile, name, counts):
+        self.profile = profile
+        self.name = name
+        self.counts = counts
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def add(self, **counts):
+        for key, value in counts.items():
+            self.counts[key] = self.counts.get(key, 0) + value
+
+    def __exit__(self, *exc):
+        self.profile.record(self.name, self.start, time.perf_counter_ns() - self.start, self.counts)
+
+class NoStage:
+    # What stage() hands out while profiling is off
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def add(self, **counts):
+        pass
+
+    def __exit__(self, *exc):
+        pass
+
+NO_STAGE = NoStage()
+
+class Profile:
+    # Time, bytes and element counts per stage of an import, kept as Chrome trace events
+    # (chrome://tracing, ui.perfetto.dev). Off unless the import asks for it
+    def __init__(self):
+        self.enabled = False
+        self.events = []
+
+    def start(self, enabled):
+        self.enabled = enabled
+        self.events = []
+
+    def stage(self, name, **counts):
+        if not self.enabled:
+            return NO_STAGE
+        return Stage(self, name, counts)
+
+    def record(self, name, start, duration, counts):
+        self.events.append({"name": name, "ph": "X", "ts": start / 1000, "dur": duration / 1000,
+                            "pid": os.getpid(), "tid": threading.get_ident(), "args": counts})
+
+    def take(self):
+        # hands the events of a worker process back to the parent
+        events = self.events
+        self.events = []
+        return events
+
+    def merge(self, events):
+        if self.enabled:
+            self.events += events
+
+    def write_trace(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
+
+    def summary(self):
+        # one line per stage, slowest first. Nested stages (weights in mesh build) count in both
+        totals = {}
+        for event in self.events:
+            calls, dur, counts = totals.get(event["name"], (0, 0.0, {}))
+            for key, value in event["args"].items():
+                counts[key] = counts.get(key, 0) + value
+            totals[event["name"]] = (calls + 1, dur + event["dur"], counts)
+        lines = []
+        for name, (calls, dur, counts) in sorted(totals.items(), key=lambda item: -item[1][1]):
+            line = "%s: %d x %.1f ms" % (name, calls, dur / 1000)
+            if counts:
+                line += ", " + ", ".join("%s %d" % item for item in sorted(counts.items()))
+            lines.append(line)
+        return "\n".join(lines)
+
+PROFILE = Profile()
+
+# What the read_* functions return, the build_* functions turn these into Blender data
+
+@dataclass(slots=True)
+class ImportSettings:
+    # Same settings as the operator, for reading milos without Blender
+    filepath: str = ""
+    low_lod_setting: bool = True
+    shadow_setting: bool = True
+    venue_setting: bool = False
+    little_endian_setting: bool = False
+    # parse cache folder, empty for no cache
+    cache_dir: str = ""
+    # record PROFILE stages, also in worker processes
+    profile: bool = False
+    # only these entries (and the materials and textures they use), empty for all
+    entry_names: tuple = ()
+    # decode textures into packed images instead of writing .dds files
+    pack_textures: bool = False
+
+@dataclass(slots=True)
+class TexData:
+    name: str
+    width: int
+    height: int
+    mip_count: int
+    encoding: int
+    # DDS payload, already byte swapped where needed
+    bitmap: bytes
+
+@dataclass(slots=True)
+class MatData:
+    name: str
+    # diffuse rgba
+    color: tuple
+    diffuse_tex: str
+    # diffuse texture alpha goes to the BSDF alpha too
+    use_alpha: bool = False
+    specular_color: tuple = None
+    emissive_tex: str = ""
+    specular_tex: str = ""
+    normal_tex: str = ""
+
+@dataclass(slots=True)
+class MeshData:
+    name: str
+    version: int
+    # 3x3 rotation then position, column major like the file
+    world: np.ndarray
+    mat_name: str
+    verts: np.ndarray
+    normals: np.ndarray
+    # one weight per bone index, in the same order as indices
+    weights: np.ndarray
+    uvs: np.ndarray
+    indices: np.ndarray
+    faces: np.ndarray
+    bone_names: list
+
+@dataclass(slots=True)
+class TransData:
+    name: str
+    parent: str
+    local_rot: tuple
+    local_pos: tuple
+    world_rot: tuple
+    world_pos: tuple
+
+@dataclass(slots=True)
+class TransAnimData:
+    target: str
+    # x, y, z, w, frame
+    rot_keys: np.ndarray
+    # x, y, z, frame
+    trans_keys: np.ndarray
+    scale_keys: np.ndarray
+
+@dataclass(slots=True)
+class PropAnimData:
+    target: str
+    prop: str
+    # value floats then frame, one row per key
+    keys: np.ndarray
+
+@dataclass(slots=True)
+class CharClipData:
+    # frame every sample lands on
+    sample_frames: np.ndarray
+    # (bone name, data path, values per sample) already in Blender axes
+    channels: list
+
+@dataclass(slots=True)
+class GroupData:
+    name: str
+    # names of the objects in the group
+    objects: list
+    # 0 for hh_lod00.grp and so on, None for groups that aren't a LOD
+    lod: int = None
+
+def element_counts(data):
+    # What a parsed entry holds, for the profile
+    if isinstance(data, MeshData):
+        return {"verts": len(data.verts), "faces": len(data.faces)}
+    if isinstance(data, TransAnimData):
+        return {"keys": len(data.rot_keys) + len(data.trans_keys) + len(data.scale_keys)}
+    if isinstance(data, CharClipData):
+        return {"keys": len(data.sample_frames) * len(data.channels)}
+    if isinstance(data, TransData):
+        return {"bones": 1}
+    if isinstance(data, GroupData):
+        return {"objects": len(data.objects)}
+    if isinstance(data, list):
+        return {"keys": sum(len(track.keys) for track in data)}
+    return {}
+
+ENTRY_END = b'\xAD\xDE\xAD\xDE'
+
+class EntrySlices(list):
+    # What split_entries returns, spans has where each entry sits in the (decompressed) milo
+    def __init__(self, pieces, spans):
+        super().__init__(pieces)
+        self.spans = spans
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return EntrySlices(list.__getitem__(self, key), self.spans[key])
+        return list.__getitem__(self, key)
+
+def split_entries(buf, start):
+    # Same pieces as buf[start:].split(ENTRY_END), but as memoryview slices so no entry gets copied
+    ends = []
+    pos = buf.find(ENTRY_END, start)
+    while pos != -1:
+        ends.append(pos)
+        pos = buf.find(ENTRY_END, pos + len(ENTRY_END))
+    offsets = np.empty((len(ends) + 1, 2), dtype=np.int64)
+    offsets[0, 0] = start
+    offsets[1:, 0] = np.array(ends, dtype=np.int64) + len(ENTRY_END)
+    offsets[:-1, 1] = ends
+    offsets[-1, 1] = len(buf)
+    view = memoryview(buf)
+    spans = offsets.tolist()
+    return EntrySlices([view[start:end] for start, end in spans], spans)
+
+# milo magics, the blocks after the header are compressed differently per type
+MILO_UNCOMPRESSED = 0xCABEDEAF
+MILO_ZLIB = 0xCBBEDEAF
+MILO_GZIP = 0xCCBEDEAF
+MILO_ZLIB_SIZED = 0xCDBEDEAF
+
+def inflate_block(Magic, block):
+    if Magic == MILO_GZIP:
+        return zlib.decompress(block, 31)
+    if Magic == MILO_ZLIB_SIZED:
+        # starts with the inflated size
+        return zlib.decompress(block[4:], -15)
+    return zlib.decompress(block, -15)
+
+def inflated_size(Magic, block, packed, MaxBlockSize):
+    # What a block inflates to going by the milo, plain zlib blocks only have the header's
+    # largest block size to go on
+    if not packed:
+        return len(block)
+    if Magic == MILO_ZLIB_SIZED:
+        return struct.unpack_from('<I', block)[0]
+    if Magic == MILO_GZIP:
+        # gzip ends with the inflated size
+        return struct.unpack_from('<I', block, len(block) - 4)[0]
+    return MaxBlockSize
+
+def inflate_into(out, pos, slot, Magic, block, packed):
+    # Inflates one block into out[pos:pos + slot], returns its size, or the inflated bytes
+    # when they don't fit the slot
+    if packed:
+        inflater = zlib.decompressobj(31 if Magic == MILO_GZIP else -15)
+        data = inflater.decompress(block[4:] if Magic == MILO_ZLIB_SIZED else block, slot)
+        rest = b'' if inflater.eof else inflater.decompress(inflater.unconsumed_tail)
+        if not inflater.eof:
+            raise zlib.error("incomplete or truncated milo block")
+        if rest:
+            return data + rest
+    else:
+        data = block
+    out[pos:pos + len(data)] = data
+    return len(data)
+
+def decompress_milo(f):
+    # Compressed milos get inflated into a new buffer laid out like an uncompressed one
+    # (same header, blocks back to back from StartOffset), so everything after this reads both the same way.
+    # The buffer is sized from the header up front and every block inflates straight into its own slot
+    f.seek(0)
+    Magic = l_int(f)
+    if Magic not in (MILO_ZLIB, MILO_GZIP, MILO_ZLIB_SIZED):
+        f.seek(0)
+        return f
+    StartOffset = l_int(f)
+    BlockCount = l_int(f)
+    MaxBlockSize = l_int(f)
+    sizes = struct.unpack('<%dI' % BlockCount, f.read(4 * BlockCount))
+    view = memoryview(f)
+    blocks = []
+    compressed = []
+    pos = StartOffset
+    for size in sizes:
+        if Magic == MILO_ZLIB_SIZED:
+            # a set high byte marks a block that was stored as is
+            compressed.append(size & 0xFF000000 == 0)
+            size &= 0x00FFFFFF
+        else:
+            compressed.append(True)
+        blocks.append(view[pos:pos + size])
+        pos += size
+    slots = [inflated_size(Magic, block, packed, MaxBlockSize) for block, packed in zip(blocks, compressed)]
+    starts = np.cumsum([StartOffset] + slots).tolist()
+    out = mmap.mmap(-1, starts[-1])
+    out[:StartOffset] = view[:StartOffset]
+    # zlib lets go of the GIL while inflating, so blocks inflate in parallel
+    with ThreadPoolExecutor() as pool:
+        inflated = list(pool.map(lambda start, slot, block, packed: inflate_into(out, start, slot, Magic, block, packed),
+                                 starts, slots, blocks, compressed))
+    for block in blocks:
+        block.release()
+    if any(not isinstance(size, int) for size in inflated):
+        # the header undersold a block, fall back to copying everything into a buffer of the real size
+        pieces = [out[start:start + size] if isinstance(size, int) else size for start, size in zip(starts, inflated)]
+        out.close()
+        out = mmap.mmap(-1, StartOffset + sum(len(piece) for piece in pieces))
+        out[:StartOffset] = view[:StartOffset]
+        out.seek(StartOffset)
+        for piece in pieces:
+            out.write(piece)
+        inflated = [len(piece) for piece in pieces]
+    else:
+        # plain zlib slots are only an upper bound, close the gaps
+        end = StartOffset
+        for start, size in zip(starts, inflated):
+            if start != end:
+                out.move(end, start, size)
+            end += size
+        if end != len(out):
+            try:
+                out.resize(end)
+            except (OSError, SystemError, ValueError):
+                # not every platform can shrink an anonymous map
+                trimmed = mmap.mmap(-1, end)
+                trimmed[:] = out[:end]
+                out.close()
+                out = trimmed
+    view.release()
+    struct.pack_into('<I', out, 0, MILO_UNCOMPRESSED)
+    struct.pack_into('<%dI' % BlockCount, out, 16, *inflated)
+    out.seek(0)
+    return out
+
+def vert_layout(itemsize, **fields):
+    # fields are name=(offset, format), anything in between is padding we skip
+    return np.dtype({
+        'names': list(fields),
+        'formats': [fmt for offset, fmt in fields.values()],
+        'offsets': [offset for offset, fmt in fields.values()],
+        'itemsize': itemsize,
+    })
+
+# GH1 (v25), GH2 PS2 (v28) - no bone indices
+LE_VERTS = vert_layout(48, pos=(0, '<3f4'), normal=(12, '<3f4'), weights=(24, '<4f4'), uv=(40, '<2f4'))
+# GH2 360 (v34)
+LE_VERTS_34 = vert_layout(72, pos=(0, '<3f4'), normal=(12, '<3f4'), weights=(24, '<4f4'), uv=(40, '<2f4'), bones=(48, '<4u2'))
+# GH2 360 (v34) with xyzw positions and normals
+LE_VERTS_34_W = vert_layout(80, pos=(0, '<3f4'), normal=(16, '<3f4'), weights=(32, '<4f4'), uv=(48, '<2f4'), bones=(56, '<4u2'))
+# LRB xbox (v34)
+BE_VERTS_34_XBOX = vert_layout(80, pos=(0, '>3f4'), normal=(16, '>3f4'), weights=(32, '>4f4'), uv=(48, '>2f4'), bones=(56, '>4u2'))
+# TBRB/GDRB wii (v36/37)
+BE_VERTS_WII = vert_layout(72, pos=(0, '>3f4'), normal=(12, '>3f4'), weights=(24, '>4f4'), uv=(40, '>2f4'), bones=(48, '>4u2'))
+# TBRB/GDRB ps3 (v36/37) - no normals on ps3
+BE_VERTS_PS3 = vert_layout(36, pos=(0, '>3f4'), uv=(12, '>2f2'), weights=(24, '4u1'), bones=(28, '>4u2'))
+# TBRB/GDRB xbox (v36/37) - normals and weights packed 10:10:10:2
+BE_VERTS_XBOX = vert_layout(36, pos=(0, '>3f4'), uv=(16, '>2f2'), packed_normal=(20, '>u4'), packed_weights=(28, '>u4'), bones=(32, '4u1'))
+# RB3 ps3 (v38)
+BE_VERTS_38_PS3 = vert_layout(40, pos=(0, '>3f4'), uv=(12, '>2f2'), weights=(24, '4u1'), bones=(32, '>4u2'))
+# RB3 xbox (v38)
+BE_VERTS_38_XBOX = vert_layout(36, pos=(0, '>3f4'), uv=(12, '>2f2'), weights=(24, '4u1'), bones=(32, '4u1'))
+# RB3 (v38) when the vertex size isn't 40
+BE_VERTS_38 = vert_layout(88, pos=(0, '>3f4'), normal=(28, '>3f4'), uv=(40, '>2f4'), weights=(48, '>4f4'), bones=(64, '>4u2'))
+
+def pick_vert_layout(f, VertCount, *layouts):
+    # first layout whose vertex block is followed by a face table that fits in the entry
+    start = f.tell()
+    size = f.seek(0, 2)
+    for layout in layouts:
+        end = start + layout.itemsize * VertCount
+        if end + 4 <= size:
+            f.seek(end)
+            FaceCount = l_int(f)
+            if end + 4 + FaceCount * 6 <= size:
+                f.seek(start)
+                return layout
+    f.seek(start)
+    return layouts[0]
+
+# 10:10:10:2 packing, x in the low bits
+DEC3_SHIFTS = np.array([0, 10, 20], np.uint32)
+
+def unpack_dec3n(packed):
+    # signed normalized 10:10:10 (two's complement, w ignored) to -1..1
+    bits = ((packed.astype(np.uint32)[:, None] >> DEC3_SHIFTS) & 1023).astype(np.int16)
+    bits -= (bits & 512) << 1
+    return np.maximum(bits / np.float32(511), np.float32(-1))
+
+def unpack_udec4n(packed):
+    # unsigned normalized 10:10:10:2 to 0..1
+    packed = packed.astype(np.uint32)
+    out = np.empty((len(packed), 4), np.float32)
+    out[:, :3] = ((packed[:, None] >> DEC3_SHIFTS) & 1023) / np.float32(1023)
+    out[:, 3] = (packed >> 30) / np.float32(3)
+    return out
+
+def read_verts(f, layout, VertCount):
+    # Decodes the whole vertex block at once, returns Verts, Normals, Weights, UVs, Indices
+    # Normals is empty for layouts that don't have them
+    if layout is None:
+        return (np.empty((0, 3), np.float32), np.empty((0, 3), np.float32), np.empty((0, 4), np.float32),
+                np.empty((0, 2), np.float32), np.empty((0, 4), np.uint16))
+    data = np.frombuffer(f.read(layout.itemsize * VertCount), dtype=layout, count=VertCount)
+    Verts = data['pos'].astype(np.float32)
+    UVs = data['uv'].astype(np.float32)
+    if 'normal' in layout.names:
+        Normals = data['normal'].astype(np.float32)
+    elif 'packed_normal' in layout.names:
+        Normals = unpack_dec3n(data['packed_normal'])
+        length = np.linalg.norm(Normals, axis=1, keepdims=True)
+        np.divide(Normals, length, out=Normals, where=length > 0)
+    else:
+        Normals = np.empty((0, 3), np.float32)
+    if 'packed_weights' in layout.names:
+        Weights = unpack_udec4n(data['packed_weights'])
+        total = Weights.sum(axis=1, keepdims=True)
+        np.divide(Weights, total, out=Weights, where=total > 0)
+    elif data['weights'].dtype == np.uint8:
+        Weights = data['weights'] / np.float32(255.0)
+    else:
+        Weights = data['weights'].astype(np.float32)
+    if 'bones' in layout.names:
+        Indices = data['bones'].astype(np.uint16)
+    else:
+        Indices = np.tile(np.arange(4, dtype=np.uint16), (VertCount, 1))
+    return Verts, Normals, Weights, UVs, Indices
 
-    filter_glob: StringProperty(
-        default="*.milo_ps3;*.milo_xbox;*.milo_wii;*.rnd_ps2;*.milo_ps2;*.rnd;*.dds;*.ccs;*.lit;*.cam",
-        options={'HIDDEN'},
-    )
 
+class MiloOptions:
+    # Import settings shared by the file browser and the entry browser
     low_lod_setting: BoolProperty(
         name="Skip Low LOD Meshes",
-        description="Skip meshes that are lower quality",
+        description="Skip meshes that are lower quality. LOD groups past LOD0 become excluded collections that import when turned on",
         default=True,
     )
 
@@ -91,6 +548,83 @@ class ImportMilo(Operator, ImportHelper):
         description="Use little endian",
         default=False,
     )
+
+    cache_setting: BoolProperty(
+        name="Cache Parsed Data",
+        description="Keep parsed meshes, bones and animations on disk so importing the same milo again is faster",
+        default=True,
+    )
+
+    pack_setting: BoolProperty(
+        name="Pack Textures",
+        description="Decode DXT1/DXT5/ATI2 textures in memory and pack them into the .blend instead of writing .dds files next to the milo",
+        default=False,
+    )
+
+    profile_setting: BoolProperty(
+        name="Profile Import",
+        description="Time every stage of the import, report a summary and write a Chrome trace (.trace.json) next to the first milo",
+        default=False,
+    )
+
+    def settings(self, filepath, entry_names=()):
+        return ImportSettings(filepath, self.low_lod_setting, self.shadow_setting, self.venue_setting,
+                              self.little_endian_setting, default_cache_dir() if self.cache_setting else "",
+                              self.profile_setting, entry_names, pack_textures=self.pack_setting)
+
+    def import_milos(self, context, items):
+        # a clip needs its character's armature built first, and so on
+        items = sorted(items, key=lambda item: item.filepath.endswith(AFTER_MILOS))
+        PROFILE.start(self.profile_setting)
+        with PROFILE.stage("import", files=len(items)):
+            for settings, entries in read_milos(items):
+                build_milo(settings, context, entries)
+        if PROFILE.enabled and items:
+            trace = os.path.splitext(items[0].filepath)[0] + ".trace.json"
+            try:
+                PROFILE.write_trace(trace)
+            except OSError as e:
+                print(e)
+            summary = PROFILE.summary()
+            print(summary)
+            self.report({'INFO'}, summary)
+        PROFILE.start(False)
+
+class ImportMilo(MiloOptions, Operator, ImportHelper):
+    """This appears in the tooltip of the operator and in the generated docs"""
+    bl_idname = "import.milo"
+    bl_label = "Import Milo"
+
+    filepath = StringProperty(subtype='FILE_PATH')
+
+    filename_ext = ".milo_ps3"
+
+    filter_glob: StringProperty(
+        default="*.milo_ps3;*.milo_xbox;*.milo_wii;*.rnd_ps2;*.milo_ps2;*.rnd;*.dds;*.ccs;*.lit;*.cam",
+        options={'HIDDEN'},
+    )
+
+    folder_setting: BoolProperty(
+        name="Whole Folder",
+        description="Import every milo in the selected folder",
+        default=False,
+    )
+
+    browse_setting: BoolProperty(
+        name="Choose Entries",
+        description="List the entries of the milo first and import only the ones picked",
+        default=False,
+    )
+
+    files: CollectionProperty(
+        type=OperatorFileListElement,
+        options={'HIDDEN', 'SKIP_SAVE'},
+    )
+
+    directory: StringProperty(
+        subtype='DIR_PATH',
+        options={'HIDDEN', 'SKIP_SAVE'},
+    )
     
     def draw(self, context):
         layout = self.layout
@@ -99,376 +633,642 @@ class ImportMilo(Operator, ImportHelper):
         layout.prop(self, "shadow_setting")
         layout.prop(self, "venue_setting")
         layout.prop(self, "little_endian_setting")
-    def execute(self, context):
-        with open(self.filepath, 'rb') as f:
-            if self.filepath.endswith('.ccs'):
-                with open(self.filepath, 'rb') as f:
-                    Version = b_int(f)
-                    f.seek(12)
-                    AnimType = b_numstring(f)
-                    if Version == 15:
-                        f.seek(46, 1)
-                        NodeCount = b_int(f)
-                        for x in range(NodeCount):
-                            Name = b_numstring(f)
-                            FloatCount = b_int(f)
-                            for x in range(FloatCount):
-                                Frame = b_float(f)
-                                Weight = b_float(f)
-                        f.seek(8, 1)
-                    elif Version == 16:
-                        f.seek(59, 1)
-                    BoneCount = b_int(f)
-                    BoneNames = []
-                    for x in range(BoneCount):
-                        BoneName = b_numstring(f)
-                        BoneNames.append(BoneName)
-                        Weight = b_float(f)
-                    for x in range(7):
-                        Count = b_int(f)
-                    f.seek(4, 1)
-                    NumSamples = b_int(f)
-                    NumFrames = b_int(f)
-                    Frames = []
-                    for x in range(NumFrames):
-                        Frame = b_float(f)
-                        Frames.append(Frame)
-                    print(NumSamples)
-                    Armature = bpy.data.objects.get('Armature')
-                    for i in range(NumSamples):
-                        frame_index = int(i / NumSamples * NumFrames)
-                        bpy.context.scene.frame_set(int(Frames[frame_index]))
-                        for Name in BoneNames:
-                            if "pos" in Name:
-                                x, y, z = struct.unpack('>hhh', f.read(6))
-                                x_float = x / 32767 * 1345
-                                y_float = y / 32767 * 1345
-                                z_float = z / 32767 * 1345
-                                Name = Name.replace('.pos', '.mesh')
-                                Bone = Armature.pose.bones.get(Name)
-                                if Bone:
-                                    Bone.location = (x_float, -z_float, y_float)
-                                    Bone.keyframe_insert("location")
-                            elif "quat" in Name:
-                                x, y, z, w = struct.unpack('>hhhh', f.read(8))
-                                x_float = x / 32767
-                                y_float = y / 32767
-                                z_float = z / 32767
-                                w_float = w / 32767
-                                Name = Name.replace('.quat', '.mesh')
-                                Bone = Armature.pose.bones.get(Name)
-                                if Bone:
-                                    Bone.rotation_mode = 'QUATERNION'
-                                    Bone.rotation_quaternion = (w_float, x_float, -z_float, y_float)
-                                    Bone.keyframe_insert("rotation_quaternion")
-                            elif "rotz" in Name:
-                                rotz = f.read(2)
-                    Armature.location = (-3, 140, 0)
-                    Armature.rotation_euler = ((math.radians(-90)), 0, 0)
-            elif self.filepath.endswith('.dds'):
-                obj = bpy.context.active_object
-                mat = obj.data.materials[0]
-                image = bpy.data.images.load(self.filepath)
-                if mat.use_nodes:
-                    nodes = mat.node_tree.nodes
-                    principled_bsdf = nodes.get('Principled BSDF')
-                    tex_image = nodes.new('ShaderNodeTexImage')
-                    tex_image.image = image
-                    links = mat.node_tree.links
-                    links.new(tex_image.outputs[0], principled_bsdf.inputs['Base Color'])
-                obj.data.materials[0] = mat
-            else:
-                basename = os.path.basename(self.filepath)
-                # Seek over magic
-                f.seek(4)
-                # Grab zlib start and block count
-                StartOffset = l_int(f)
-                FileCount = l_int(f)
-                f.seek(16)
-                compressed = []
-                for x in range(FileCount):
-                    compressed.append(l_int(f))
-                f.seek(StartOffset)
-                dirs = []
-                filenames = []
-                MatTexNames = []
-                MatTexFiles = []
-                if self.little_endian_setting:
-                    Version = l_int(f)
-                    if Version > 10:
-                        DirType = l_numstring(f)
-                        DirName = l_numstring(f)
-                        dirs.append(DirType)
-                        filenames.append(DirName)
-                        f.seek(8, 1)
-                        EntryCount = l_int(f)
-                        for x in range(EntryCount):
-                            DirType = l_numstring(f)
-                            DirName = l_numstring(f)
-                            dirs.append(DirType)
-                            filenames.append(DirName)
-                    elif Version == 10:
-                        EntryCount = l_int(f)
-                        for x in range(EntryCount):
-                            DirType = l_numstring(f)
-                            DirName = l_numstring(f)
-                            dirs.append(DirType)
-                            filenames.append(DirName)
-                        ExtPathCount = l_int(f)
-                        for x in range(ExtPathCount):
-                            ExtPath = l_numstring(f)
-                    rest = f.read()
-                    files = rest.split(b'\xAD\xDE\xAD\xDE')
-                    for directory, name, file in zip(dirs, filenames, files):                        
-                        if ".mat" in name and "Mat" in directory:
-                            MatTexNames.append(name)
-                            MatTexFiles.append(file)
-                        if "Tex" in directory:                                    
-                            Tex(basename, self, name, file)
-                            MatTexNames.append(name)
-                            MatTexFiles.append(file)
-                        if ".mesh" in name and "Mesh" in directory:
-                            Mesh(self, context, name, file, basename, MatTexNames, MatTexFiles)
-                        if ".mesh" in name and "Trans" in directory:
-                            Trans(basename, self, name, file)
-                        if "TransAnim" in directory:
-                            TransAnim(self, name, basename, file)
-                        elif "PropAnim" in directory:
-                            PropAnim(self, file)
-                       # if ".lit" in name and "Light" in directory:
-                       #     Light(self, file, name)
-                       # elif ".cam" in name and "Cam" in directory:
-                       #      Cam(self, file)
-                else:
-                    Version = b_int(f)
-                    DirType = b_numstring(f)
-                    DirName = b_numstring(f)
-                    dirs.append(DirType)
-                    filenames.append(DirName)
-                    if Version < 32:
-                        f.seek(8, 1)
-                    else:
-                        f.seek(9, 1)
-                    EntryCount = b_int(f)
-                    for x in range(EntryCount):
-                        dirs.append(b_numstring(f))
-                        filenames.append(b_numstring(f))
-                    if self.venue_setting:
-                        f.seek(0)
-                        rest_file = f.read()
-                        sequence = "_geom.milo".encode('utf-8')
-                        offset = rest_file.find(sequence)
-                        f.seek(offset)
-                        f.seek(10, 1)
-                        f.seek(4, 1)
-                        geomdirs = []
-                        geomnames = []
-                        geomfiles = []
-                        DirType = b_numstring(f)
-                        DirName = b_numstring(f)
-                        geomdirs.append(DirType)
-                        geomnames.append(DirName)
-                        f.seek(8, 1)
-                        EntryCount = b_int(f)
-                        for x in range(EntryCount):
-                            geomdirs.append(b_numstring(f))
-                            geomnames.append(b_numstring(f))
-                        rest = f.read()
-                        files = rest.split(b'\xAD\xDE\xAD\xDE')
-                        for directory, name, file in zip(geomdirs, geomnames, files):
-                            if ".mat" in name and "Mat" in directory:
-                                MatTexNames.append(name)
-                                MatTexFiles.append(file)
-                            if "Tex" in directory:                                    
-                                Tex(basename, self, name, file)
-                                MatTexNames.append(name)
-                                MatTexFiles.append(file)
-                            if ".mesh" in name and "Mesh" in directory:
-                                Mesh(self, context, name, file, basename, MatTexNames, MatTexFiles)                            
-                            if ".mesh" in name and "Trans" in directory:
-                                Trans(basename, self, name, file)
-                            if "TransAnim" in directory:
-                                TransAnim(self, name, basename, file)
-                            elif "PropAnim" in directory:
-                                PropAnim(self, file)
-                           # if ".lit" in name and "Light" in directory:
-                           #     Light(self, file, name)
-                           # elif ".cam" in name and "Cam" in directory:
-                           #     Cam(self, file)
-                    if Version < 32:
-                        rest_file = f.read()
-                        files = rest_file.split(b'\xAD\xDE\xAD\xDE')
-                        min_length = min(len(dirs), len(filenames))
-                        if len(files) > min_length:
-                            files = files[:min_length]
-                        if dirs and filenames and dirs[0] == "ObjectDir":
-                            dirs.pop(0)
-                            filenames.pop(0)
-                        for directory, name, file in zip(dirs, filenames, files):
-                            print(directory, name, file[:4])
-                            if ".mat" in name and "Mat" in directory:
-                                MatTexNames.append(name)
-                                MatTexFiles.append(file)
-                            if "Tex" in directory:                                    
-                                Tex(basename, self, name, file)
-                                MatTexNames.append(name)
-                                MatTexFiles.append(file)
-                            if ".mesh" in name and "Mesh" in directory:
-                                Mesh(self, context, name, file, basename, MatTexNames, MatTexFiles)
-                            if ".mesh" in name and "Trans" in directory:
-                                Trans(basename, self, name, file)
-                            if "bone" in name and "Mesh" in directory:
-                                MeshTrans(basename, self, name, file)
-                           # if "TransAnim" in directory:
-                           #     TransAnim(self, name, basename, file)
-                            elif "PropAnim" in directory:
-                                PropAnim(self, file)
-                           # if ".lit" in name and "Light" in directory:
-                           #     Light(self, file, name,)
-                           # elif ".cam" in name and "Cam" in directory:
-                           #     Cam(self, file)
+        layout.prop(self, "folder_setting")
+        layout.prop(self, "browse_setting")
+        layout.prop(self, "pack_setting")
+        layout.prop(self, "cache_setting")
+        layout.prop(self, "profile_setting")
+
+    def import_paths(self):
+        directory = self.directory or os.path.dirname(self.filepath)
+        if self.folder_setting:
+            names = sorted(name for name in os.listdir(directory) if name.endswith(MILO_EXTENSIONS))
+            return [os.path.join(directory, name) for name in names]
+        names = [file.name for file in self.files if file.name and not file.name.endswith('.dds')]
+        if not names:
+            return [self.filepath]
+        return [os.path.join(directory, name) for name in names]
 
+    def execute(self, context):
+        if self.filepath.endswith('.dds') and not self.folder_setting:
+            obj = bpy.context.active_object
+            mat = obj.data.materials[0]
+            image = bpy.data.images.load(self.filepath)
+            if mat.use_nodes:
+                nodes = mat.node_tree.nodes
+                principled_bsdf = nodes.get('Principled BSDF')
+                tex_image = nodes.new('ShaderNodeTexImage')
+                tex_image.image = image
+                links = mat.node_tree.links
+                links.new(tex_image.outputs[0], principled_bsdf.inputs['Base Color'])
+            obj.data.materials[0] = mat
+            return {'FINISHED'}
+        paths = self.import_paths()
+        if self.browse_setting and not self.folder_setting and not paths[0].endswith('.ccs'):
+            # one milo, the rest happens in the entry browser
+            options = {key: getattr(self, key) for key in MiloOptions.__annotations__}
+            bpy.ops.import_scene.milo_entries('INVOKE_DEFAULT', filepath=paths[0], **options)
+            return {'FINISHED'}
+        self.import_milos(context, [self.settings(path) for path in paths])
         return {'FINISHED'}                
 
-def Tex(basename, self, filename, file):
+class MiloEntry(PropertyGroup):
+    # One row of the entry browser, name is the entry name
+    kinds: StringProperty()
+    size: IntProperty()
+    # directory the entry sits in, for venues with inlined sub directories
+    path: StringProperty()
+    selected: BoolProperty(default=False)
+
+class MILO_UL_entries(UIList):
+    def draw_item(self, context, layout, data, item, icon, active_data, active_propname, index):
+        row = layout.row()
+        row.prop(item, "selected", text="")
+        row.label(text=item.name)
+        row.label(text=item.path)
+        row.label(text=item.kinds)
+        row.label(text="%.1f KB" % (item.size / 1024))
+
+class ImportMiloEntries(MiloOptions, Operator):
+    """Import only the picked entries of a milo, with the materials and textures they use"""
+    bl_idname = "import_scene.milo_entries"
+    bl_label = "Import Milo Entries"
+
+    filepath: StringProperty(
+        subtype='FILE_PATH',
+        options={'HIDDEN'},
+    )
+
+    entries: CollectionProperty(
+        type=MiloEntry,
+        options={'HIDDEN', 'SKIP_SAVE'},
+    )
+
+    active_entry: IntProperty(
+        options={'HIDDEN', 'SKIP_SAVE'},
+    )
+
+    def invoke(self, context, event):
+        # Only the directory table gets read here, entries are parsed once picked
+        self.entries.clear()
+        try:
+            found = scan_milo(self.settings(self.filepath))
+        except Exception as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+        for name, kinds, size, path in found:
+            item = self.entries.add()
+            item.name = name
+            item.kinds = ", ".join(kinds)
+            item.size = size
+            item.path = path
+        return context.window_manager.invoke_props_dialog(self, width=600)
+
+    def draw(self, context):
+        layout = self.layout
+        layout.label(text="%s, %d entries" % (os.path.basename(self.filepath), len(self.entries)))
+        layout.template_list("MILO_UL_entries", "", self, "entries", self, "active_entry", rows=15)
+
+    def execute(self, context):
+        names = tuple(item.name for item in self.entries if item.selected)
+        if not names:
+            self.report({'WARNING'}, "No entries picked")
+            return {'CANCELLED'}
+        self.import_milos(context, [self.settings(self.filepath, names)])
+        return {'FINISHED'}
+
+def fill_mesh(mesh, Verts, Faces, UVs, smooth):
+    # Same result as from_pydata + a UV write per loop, but through foreach_set
+    Faces = np.asarray(Faces, dtype=np.int32).reshape(-1, 3)
+    LoopVerts = Faces.ravel()
+    FaceCount = len(Faces)
+    mesh.vertices.add(len(Verts))
+    mesh.vertices.foreach_set('co', np.ascontiguousarray(Verts, dtype=np.float32).ravel())
+    mesh.loops.add(len(LoopVerts))
+    mesh.loops.foreach_set('vertex_index', LoopVerts)
+    mesh.polygons.add(FaceCount)
+    mesh.polygons.foreach_set('loop_start', np.arange(0, len(LoopVerts), 3, dtype=np.int32))
+    mesh.polygons.foreach_set('loop_total', np.full(FaceCount, 3, dtype=np.int32))
+    mesh.polygons.foreach_set('use_smooth', np.full(FaceCount, smooth, dtype=bool))
+    mesh.update(calc_edges=True)
+    uv_layer = mesh.uv_layers.new(name="UVMap")
+    FlipUVs = np.array(UVs, dtype=np.float32).reshape(-1, 2)
+    FlipUVs[:, 1] = 1 - FlipUVs[:, 1]
+    uv_layer.data.foreach_set('uv', FlipUVs[LoopVerts].ravel())
+
+def assign_weights(obj, BoneNames, Indices, Weights):
+    # One add() per (bone, weight) pair instead of one per vertex per influence.
+    # Sorting by bone then weight puts every pair in a run, so all groups get set in a single pass
+    Indices = np.asarray(Indices, dtype=np.int64)
+    if Indices.size == 0:
+        return True
+    if Indices.max() >= len(BoneNames):
+        return False
+    Bones = Indices.ravel()
+    Values = np.asarray(Weights, dtype=np.float32).ravel()
+    VertIDs = np.repeat(np.arange(len(Indices)), Indices.shape[1])
+    order = np.lexsort((VertIDs, Values, Bones))
+    Bones = Bones[order]
+    Values = Values[order]
+    VertIDs = VertIDs[order]
+    starts = np.flatnonzero(np.r_[True, (Bones[1:] != Bones[:-1]) | (Values[1:] != Values[:-1])])
+    ends = np.r_[starts[1:], len(Bones)]
+    groups = {}
+    for bone in np.unique(Bones).tolist():
+        group_name = BoneNames[bone] or "Group"
+        group = obj.vertex_groups.get(group_name)
+        if group is None:
+            group = obj.vertex_groups.new(name=group_name)
+        groups[bone] = group
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        groups[int(Bones[start])].add(VertIDs[start:end].tolist(), float(Values[start]), 'ADD')
+    return True
+
+def key_fcurves(obj, data_path, Frames, Values, group=""):
+    # Leaves the same keys keyframe_insert would (last value for a frame wins, keys on other
+    # frames are kept), but each channel is written as a whole F-curve with one foreach_set
+    Frames = np.asarray(Frames, dtype=np.float32).ravel()
+    if len(Frames) == 0:
+        return
+    Values = np.asarray(Values, dtype=np.float32).reshape(len(Frames), -1)
+    last = len(Frames) - 1 - np.unique(Frames[::-1], return_index=True)[1]
+    Frames = Frames[last]
+    Values = Values[last]
+    if obj.animation_data is None:
+        obj.animation_data_create()
+    action = obj.animation_data.action
+    if action is None:
+        action = bpy.data.actions.new(name=obj.name + "Action")
+        obj.animation_data.action = action
+    for index in range(Values.shape[1]):
+        co = np.empty((len(Frames), 2), dtype=np.float32)
+        co[:, 0] = Frames
+        co[:, 1] = Values[:, index]
+        fcurve = action.fcurves.find(data_path, index=index)
+        if fcurve is not None:
+            old = np.empty(len(fcurve.keyframe_points) * 2, dtype=np.float32)
+            fcurve.keyframe_points.foreach_get('co', old)
+            old = old.reshape(-1, 2)
+            co = np.concatenate((old[~np.isin(old[:, 0], Frames)], co))
+            co = co[np.argsort(co[:, 0], kind='stable')]
+            if fcurve.group is not None:
+                group = fcurve.group.name
+            action.fcurves.remove(fcurve)
+        fcurve = action.fcurves.new(data_path, index=index, action_group=group)
+        fcurve.keyframe_points.add(len(co))
+        fcurve.keyframe_points.foreach_set('co', co.ravel())
+        fcurve.update()
+
+# DXT1, DXT5, ATI2
+DDS_FOURCC = {8: 827611204, 24: 894720068, 32: 843666497}
+
+def dds_header(Width, Height, MipMapCount, Encoding):
+    return struct.pack('<32I', 542327876, 124, 528391, Height, Width, 0, 0, MipMapCount, *([0] * 11),
+                       32, 4, DDS_FOURCC.get(Encoding, 0), 0, 0, 0, 0, 0, 4096, 0, 0, 0, 0)
+
+def swap16(Bitmap):
+    # xbox and little endian bitmaps are stored as byte swapped 16 bit words, an odd last byte stays put
+    even = len(Bitmap) & ~1
+    return np.frombuffer(Bitmap, dtype='>u2', count=even // 2).byteswap().tobytes() + Bitmap[even:]
+
+# bytes per 4x4 block of DXT1, DXT5, ATI2
+DXT_BLOCK_BYTES = {8: 8, 24: 16, 32: 16}
+
+def dxt_colors(blocks, punchthrough):
+    # (N, 8) DXT1 style colour blocks to (N, 16, 4) RGBA. Only DXT1 has the 3 colour + transparent mode
+    words = blocks[:, :4].copy().view('<u2').astype(np.int32)
+    c0 = words[:, 0]
+    c1 = words[:, 1]
+    def rgb565(c):
+        return np.stack((((c >> 11) & 31) * 255 // 31, ((c >> 5) & 63) * 255 // 63, (c & 31) * 255 // 31), axis=1)
+    p0 = rgb565(c0)
+    p1 = rgb565(c1)
+    four = (c0 > c1) | (not punchthrough)
+    palette = np.empty((len(blocks), 4, 4), np.int32)
+    palette[:, 0, :3] = p0
+    palette[:, 1, :3] = p1
+    palette[:, 2, :3] = np.where(four[:, None], (2 * p0 + p1 + 1) // 3, (p0 + p1) // 2)
+    palette[:, 3, :3] = np.where(four[:, None], (p0 + 2 * p1 + 1) // 3, 0)
+    palette[:, :, 3] = 255
+    palette[:, 3, 3] = np.where(four, 255, 0)
+    bits = blocks[:, 4:8].copy().view('<u4')
+    index = (bits >> (2 * np.arange(16, dtype=np.uint32))) & 3
+    return palette[np.arange(len(blocks))[:, None], index]
+
+def dxt_alpha(blocks):
+    # (N, 8) DXT5 alpha / ATI2 channel blocks to (N, 16) values
+    a0 = blocks[:, 0].astype(np.int32)[:, None]
+    a1 = blocks[:, 1].astype(np.int32)[:, None]
+    bits = np.zeros(len(blocks), np.uint64)
+    for k in range(6):
+        bits |= blocks[:, 2 + k].astype(np.uint64) << np.uint64(8 * k)
+    index = (bits[:, None] >> (np.uint64(3) * np.arange(16, dtype=np.uint64))) & np.uint64(7)
+    step = np.arange(1, 7)
+    eight = ((7 - step) * a0 + step * a1 + 3) // 7
+    step = np.arange(1, 5)
+    six = np.concatenate((((5 - step) * a0 + step * a1 + 2) // 5,
+                          np.zeros_like(a0), np.full_like(a0, 255)), axis=1)
+    palette = np.concatenate((a0, a1, np.where(a0 > a1, eight, six)), axis=1)
+    return palette[np.arange(len(blocks))[:, None], index.astype(np.intp)]
+
+def decode_dxt(tex):
+    # Top mip of a DXT1/DXT5/ATI2 TexData as (height, width, 4) RGBA bytes, bottom row first
+    # like Blender image pixels. None for other encodings
+    size = DXT_BLOCK_BYTES.get(tex.encoding)
+    if size is None:
+        return None
+    BlocksWide = max(1, (tex.width + 3) // 4)
+    BlocksHigh = max(1, (tex.height + 3) // 4)
+    count = BlocksWide * BlocksHigh
+    raw = np.frombuffer(tex.bitmap, dtype=np.uint8, count=min(len(tex.bitmap), count * size))
+    blocks = np.zeros((count, size), np.uint8)
+    blocks.ravel()[:len(raw)] = raw
+    if tex.encoding == 8:
+        texels = dxt_colors(blocks, True)
+    elif tex.encoding == 24:
+        texels = dxt_colors(blocks[:, 8:], False)
+        texels[:, :, 3] = dxt_alpha(blocks[:, :8])
+    else:
+        # two channel normal map, z comes back from x and y
+        x = dxt_alpha(blocks[:, :8])
+        y = dxt_alpha(blocks[:, 8:])
+        z = np.sqrt(np.clip(1 - (x / 127.5 - 1) ** 2 - (y / 127.5 - 1) ** 2, 0, 1))
+        texels = np.stack((x, y, np.rint((z + 1) * 127.5).astype(np.int32), np.full_like(x, 255)), axis=2)
+    image = texels.reshape(BlocksHigh, BlocksWide, 4, 4, 4).transpose(0, 2, 1, 3, 4).reshape(BlocksHigh * 4, BlocksWide * 4, 4)
+    return np.ascontiguousarray(image[:tex.height, :tex.width][::-1], dtype=np.uint8)
+
+def read_tex(self, filename, file, basename):
     f = io.BytesIO(file)
+    if self.little_endian_setting:
+        Version = l_int(f)
+        if Version == 8 or basename.endswith('.milo_ps2'):
+            return None
+        f.seek(17)
+        Width = l_int(f)
+        Height = l_int(f)
+        f.seek(29)
+        TexName = l_numstring(f)
+        f.seek(11, 1)
+        Encoding = l_int(f)
+        MipMapCount = struct.unpack('B', f.read(1))[0]
+        f.seek(25, 1)
+        Bitmap = swap16(f.read())
+    else:
+        Version = b_int(f)
+        if Version == 10:
+            f.seek(17)
+        elif Version == 11:
+            f.seek(18)
+        Width = b_int(f)
+        Height = b_int(f)
+        if Version == 11:
+            BPP = b_int(f)
+            if not BPP == 4 or BPP == 8:
+                f.seek(-13, 1)
+                Width = b_int(f)
+                Height = b_int(f)
+                f.seek(4, 1)
+        if Version == 10:
+            f.seek(29)
+        elif Version == 11:
+            f.seek(30)
+        if Version == 11:
+            TexNameStart = f.tell()
+            try:
+                TexName = b_numstring(f)
+            except:
+                f.seek(TexNameStart)
+                f.seek(-1, 1)
+                TexName = b_numstring(f)
+            if len(TexName) == 0:
+                f.seek(-1, 1)
+                TexName = b_numstring(f)
+        else:
+            TexName = b_numstring(f)
+        f.seek(11, 1)
+        Encoding = b_int(f)
+        if Version == 11:
+            if not Encoding == 8 or Encoding == 24 or Encoding == 32:
+                f.seek(-3, 1)
+                Encoding = b_int(f)
+        MipMapCount = struct.unpack('>B', f.read(1))[0]
+        f.seek(25, 1)
+        Bitmap = f.read()
+        if basename.endswith('.milo_xbox'):
+            Bitmap = swap16(Bitmap)
+    return TexData(filename, Width, Height, MipMapCount, Encoding, Bitmap)
+
+def write_dds(path, tex):
+    # Through a temp file, a worker importing another milo from the same folder can be reading it
+    tmp = "%s.%d.tmp" % (path, os.getpid())
+    with open(tmp, 'wb') as out:
+        out.write(dds_header(tex.width, tex.height, tex.mip_count, tex.encoding))
+        out.write(tex.bitmap)
+    os.replace(tmp, path)
+
+def dds_matches(path, tex):
+    # True when the .dds on disk already holds exactly what write_dds would write
+    header = dds_header(tex.width, tex.height, tex.mip_count, tex.encoding)
     try:
-        if self.little_endian_setting:
-            Version = l_int(f)
-            if Version == 8 or basename.endswith('.milo_ps2'):
-                return
-            else:
-                f.seek(17)
-                Width = l_int(f)
-                Height = l_int(f)
-                f.seek(29)
-                TexName = l_numstring(f)
-                f.seek(11, 1)
-                Encoding = l_int(f)
-                MipMapCount = struct.unpack('B', f.read(1))[0]
-                f.seek(25, 1)
-                BitmapStart = f.tell()
-                Bitmap = f.read()
-                Pixels = []
-                f.seek(BitmapStart)
-                for x in range(len(Bitmap)):
-                    Pixel1 = f.read(1)
-                    Pixel2 = f.read(1)
-                    Pixels.append((Pixel1, Pixel2))
-                path = os.path.join(os.path.dirname(self.filepath), filename[:-4] + ".dds")
-                with open(path, 'wb') as out:
-                    out.write(struct.pack('I', 542327876))
-                    out.write(struct.pack('I', 124))
-                    out.write(struct.pack('I', 528391))
-                    out.write(struct.pack('II', Height, Width))
-                    out.write(struct.pack('II', 0, 0))
-                    out.write(struct.pack('I', MipMapCount))
-                    for x in range(11):
-                        out.write(struct.pack('I', 0))
-                    out.write(struct.pack('I', 32))
-                    out.write(struct.pack('I', 4))
-                    if Encoding == 8:
-                        out.write(struct.pack('I', 827611204))
-                    elif Encoding == 24:
-                        out.write(struct.pack('I', 894720068))
-                    elif Encoding == 32:
-                        out.write(struct.pack('I', 843666497))
-                    for x in range(5):
-                        out.write(struct.pack('I', 0))
-                    out.write(struct.pack('I', 4096))
-                    for x in range(4):
-                        out.write(struct.pack('I', 0))
-                    for Pixel in Pixels:
-                        pixel1, pixel2 = Pixel
-                        out.write(pixel2)
-                        out.write(pixel1)
-                print("Converted + exported texture:", filename)
+        if os.path.getsize(path) != len(header) + len(tex.bitmap):
+            return False
+        with open(path, 'rb') as f:
+            return f.read(len(header)) == header and f.read() == tex.bitmap
+    except OSError:
+        return False
+
+# Custom property images and materials keep the hash of the entries they were built from in
+HASH_PROP = "hmx_hash"
+
+def entry_hash(file, *salt):
+    h = hashlib.blake2b(file, digest_size=16)
+    for x in salt:
+        h.update(x.encode('utf-8'))
+    return h.hexdigest()
+
+def hashed_ids(collection):
+    return {ID[HASH_PROP]: ID for ID in collection if ID.get(HASH_PROP) is not None}
+
+# .dds files written or checked by this process, path -> (entry hash, size, mtime), so the same
+# texture showing up again skips even the parse. Anything else gets compared with the file on disk
+DDS_WRITTEN = {}
+
+def dds_stamp(path, digest):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (digest, st.st_size, st.st_mtime_ns)
+
+def export_tex(basename, self, filename, file):
+    # Writes the .dds next to the milo, returns the hash the texture is cached under, or None for
+    # textures read_tex doesn't handle (LE v8, ps2). Anything going wrong is raised
+    path = os.path.join(os.path.dirname(self.filepath), filename[:-4] + ".dds")
+    digest = entry_hash(file, os.path.splitext(basename)[1], str(self.little_endian_setting))
+    stamp = dds_stamp(path, digest)
+    if stamp is not None and DDS_WRITTEN.get(path) == stamp:
+        debug("Texture already exported:", filename)
+        return digest
+    with PROFILE.stage("parse tex", bytes=len(file)) as stage:
+        tex = read_tex(self, filename, file, basename)
+        if tex is None:
+            return None
+        if dds_matches(path, tex):
+            debug("Texture already exported:", filename)
         else:
-            Version = b_int(f)
-            if Version == 10:
-                f.seek(17)
-            elif Version == 11:
-                f.seek(18)
-            Width = b_int(f)
-            Height = b_int(f)
-            if Version == 11:
-                BPP = b_int(f)
-                if not BPP == 4 or BPP == 8:
-                    f.seek(-13, 1)
-                    Width = b_int(f)
-                    Height = b_int(f)
-                    f.seek(4, 1)
-            if Version == 10:
-                f.seek(29)
-            elif Version == 11:
-                f.seek(30)
-            if Version == 11:
-                TexNameStart = f.tell()
-                try:
-                    TexName = b_numstring(f)
-                except:
-                    f.seek(TexNameStart)
-                    f.seek(-1, 1)
-                    TexName = b_numstring(f)
-                if len(TexName) == 0:
-                    f.seek(-1, 1)
-                    TexName = b_numstring(f)
-            else:
-                TexName = b_numstring(f)
-            f.seek(11, 1)
-            Encoding = b_int(f)
-            if Version == 11:
-                if not Encoding == 8 or Encoding == 24 or Encoding == 32:
-                    f.seek(-3, 1)
-                    Encoding = b_int(f)
-            MipMapCount = struct.unpack('>B', f.read(1))[0]
-            f.seek(25, 1)
-            if basename.endswith('.milo_xbox'):
-                BitmapStart = f.tell()
-                Bitmap = f.read()
-                Pixels = []
-                f.seek(BitmapStart)
-                for x in range(len(Bitmap)):
-                    Pixel1 = f.read(1)
-                    Pixel2 = f.read(1)
-                    Pixels.append((Pixel1, Pixel2))
-            else:
-                Bitmap = f.read()
-            path = os.path.join(os.path.dirname(self.filepath), filename[:-4] + ".dds")
-            with open(path, 'wb') as out:
-                out.write(struct.pack('I', 542327876))
-                out.write(struct.pack('I', 124))
-                out.write(struct.pack('I', 528391))
-                out.write(struct.pack('II', Height, Width))
-                out.write(struct.pack('II', 0, 0))
-                out.write(struct.pack('I', MipMapCount))
-                for x in range(11):
-                    out.write(struct.pack('I', 0))
-                out.write(struct.pack('I', 32))
-                out.write(struct.pack('I', 4))
-                if Encoding == 8:
-                    out.write(struct.pack('I', 827611204))
-                elif Encoding == 24:
-                    out.write(struct.pack('I', 894720068))
-                elif Encoding == 32:
-                    out.write(struct.pack('I', 843666497))
-                for x in range(5):
-                    out.write(struct.pack('I', 0))
-                out.write(struct.pack('I', 4096))
-                for x in range(4):
-                    out.write(struct.pack('I', 0))
-                if basename.endswith('.milo_xbox'):
-                    for Pixel in Pixels:
-                        pixel1, pixel2 = Pixel
-                        out.write(pixel2)
-                        out.write(pixel1)
-                else:
-                    out.write(Bitmap)
-                print("Converted + exported texture:", filename)            
+            write_dds(path, tex)
+        DDS_WRITTEN[path] = dds_stamp(path, digest)
+        stage.add(pixels=tex.width * tex.height)
+    debug("Converted + exported texture:", filename)
+    return digest
+
+def Tex(basename, self, filename, file):
+    # Returns the hash the texture is cached under, or None when nothing got exported
+    try:
+        return export_tex(basename, self, filename, file)
+    except Exception as e:
+        print(e)
+    return None
+
+def packed_tex(basename, self, filename, file):
+    # Tex without the .dds: (hash, TexData) for the material registry to decode and pack,
+    # (None, None) when the texture can't be decoded here. The hash differs from the .dds one,
+    # so packing never settles for an image an earlier import loaded from a .dds
+    try:
+        tex = read_tex(self, filename, file, basename)
+        if tex is not None and tex.encoding in DXT_BLOCK_BYTES:
+            return entry_hash(file, os.path.splitext(basename)[1], str(self.little_endian_setting), "packed"), tex
     except Exception as e:
         print(e)
-        
-def Mesh(self, context, filename, file, basename, MatTexNames, MatTexFiles):
+    return None, None
+
+def pixel_image(name, pixels):
+    # Packed image from decoded RGBA bytes, nothing on disk
+    Height, Width = pixels.shape[:2]
+    image = bpy.data.images.new(name, Width, Height, alpha=True)
+    image.pixels.foreach_set((pixels.astype(np.float32) / np.float32(255)).ravel())
+    image.pack()
+    return image
+
+def read_mat(self, filename, file):
+    f = io.BytesIO(file)
+    if self.little_endian_setting:
+        f.seek(21)
+        Color = struct.unpack('4f', f.read(16))
+        f.seek(101)
+        return MatData(filename, Color, l_numstring(f))
+    Version = b_int(f)
+    f.seek(21)
+    Color = struct.unpack('>4f', f.read(16))
+    if Version == 28:
+        return MatData(filename, Color, b_numstring(f))
+ # version size + metadata size + blend size = file seek number/9+10=21
+   # 4h/ 00 00 00 00/01/02/03/04/05/06
+   # kBlendDest,             00
+   # kBlendSrc,              01
+   # kBlendAdd,              02
+   # kBlendSrcAlpha,         03
+   # kBlendSubtract,         04
+   # kBlendMultiply,         05
+   # kPreMultAlpha,          06
+    debug("diff rgb", *Color[:3])
+    alpha = b_float(f)
+    prelit = b_bool(f)
+    use_environ = b_bool(f)
+    z_mode = b_float(f)
+   # 4h/ 00 00 00 00/01/02/03/04
+   # kZModeDisable,         00
+   # kZModeNormal,          01
+   # kZModeTransparent,     02
+   # kZModeForce,           03
+   # kZModeDecal,           04
+    alpha_cut = b_bool(f)
+    alpha_threshold = l_int(f)
+    alpha_write = b_bool(f)
+    tex_gen = b_float(f)
+   # 4h/ 00 00 00 00/01/02/03/04/05
+   # kTexGenNone,           00
+   # kTexGenXfm,            01
+   # kTexGenSphere,         02
+   # kTexGenProjected,      03
+   # kTexGenXfmOrigin,      04
+   # kTexGenEnviron,        05
+    tex_wrap = b_float(f)
+   # 4h/ 00 00 00 00/01/02/03/04
+   # kTexWrapClamp,         00
+   # kTexWrapRepeat,        01
+   # kTexBorderBlack,       02
+   # kTexBorderWhite,       03
+   # kTexWrapMirror,        04
+   # tex_xfm = 30h MATRIX
+ # skip tex xfm. WE DONT NEED IT
+    f.seek(105)
+    TexName = b_numstring(f)
+    debug("material", filename, "DIFF TEX name", TexName)
+    next_pass = b_numstring(f)
+    intensify = b_bool(f)
+    cull = b_bool(f)
+    emissive_multiplier = b_float(f)
+    SpecColor = struct.unpack('>3f', f.read(12))
+    debug("spec rgb", *SpecColor)
+    specular_power = b_float(f)
+  # most milos have this set to tex.tex
+    normal_map = b_numstring(f)
+    EMTexName = b_numstring(f)
+    debug("EMISSIVE TEX name", EMTexName)
+    SPECTexName = b_numstring(f)
+    debug("SPEC TEX name", SPECTexName)
+    environ_map = b_numstring(f)
+   # reflection map??? just reuse the tex code from above^^^
+    per_pixel_light = b_bool(f)
+    stencil_mode = b_float(f)
+   # 4h/ 00 00 00 00/01/02
+   # kStencilIgnore,        00
+   # kStencilWrite,         01
+   # kStencilTest,          02
+    fur = b_numstring(f)
+    de_normal = b_float(f)
+    anisotropy = b_float(f)
+    norm_detail_tiling = b_float(f)
+    norm_detail_strength = b_float(f)
+    NTexName = b_numstring(f)
+    debug("NORM TEX name", NTexName, "normal detail strength", norm_detail_strength)
+   # after this: point_lights, proj_lights, fog, fade_out, color_adjust (bools), rim rgb,
+   # rim_power, rim_map, rim_always_show, screen_aligned, shader_variation, specular2 rgb,
+   # five unknown floats, alpha_mask, ps3_force_trilinear (xbox milos have this too)
+   # 4h/ 00 00 00 00/01/02
+   # kShaderVariationNone,  00
+   # kShaderVariationSkin,  01
+   # kShaderVariationHair,  02
+    return MatData(filename, Color, TexName, True, SpecColor, EMTexName, SPECTexName, NTexName)
+
+# BSDF inputs are the blender 3 names, Emission is #26 / Specular #13 / Normal #5 on blender 4
+MAT_TEX_INPUTS = (('diffuse_tex', 'Base Color'), ('emissive_tex', 'Emission'),
+                  ('specular_tex', 'Specular'), ('normal_tex', 'Normal'))
+
+def build_material(mat, data, image):
+    mat.diffuse_color = data.color
+    if data.specular_color is not None:
+        mat.specular_color = data.specular_color
+    for field, socket in MAT_TEX_INPUTS:
+        tex_image = image(getattr(data, field))
+        if tex_image is None:
+            continue
+        if not mat.use_nodes:
+            mat.use_nodes = True
+        bsdf = mat.node_tree.nodes.get("Principled BSDF")
+        if bsdf is None:
+            continue
+        tex_node = mat.node_tree.nodes.new('ShaderNodeTexImage')
+        tex_node.image = tex_image
+        links = mat.node_tree.links
+        if socket == 'Normal':
+            # TODO: make the strength value be 'norm_detail_strength'
+            NORM_node = mat.node_tree.nodes.new('ShaderNodeNormalMap')
+            links.new(NORM_node.inputs[1], tex_node.outputs['Color'])
+            links.new(bsdf.inputs['Normal'], NORM_node.outputs['Normal'])
+        else:
+            links.new(bsdf.inputs[socket], tex_node.outputs['Color'])
+            if socket == 'Base Color' and data.use_alpha:
+                links.new(bsdf.inputs['Alpha'], tex_node.outputs['Alpha'])
+
+class MaterialRegistry:
+    # One per import. Meshes get a material by name here, every .mat is read once, every
+    # texture loaded once and every node tree built once in finish(). Images and materials
+    # are tagged with the hash of their entries so later imports reuse them instead
+    def __init__(self, settings):
+        self.settings = settings
+        self.mats = {}
+        self.tex_hashes = {}
+        # TexData of the textures that get packed instead of going through .dds files
+        self.tex_data = {}
+        self.images = {}
+        self.materials = {}
+        self.textured = set()
+        self.cached_images = None
+
+    def add_mat(self, name, data, digest):
+        self.mats[name] = (data, digest)
+
+    def add_tex(self, name, digest, tex=None):
+        if digest is not None:
+            self.tex_hashes[name] = digest
+        if tex is not None:
+            self.tex_data[name] = tex
+
+    def material(self, name, link_textures):
+        mat = self.materials.get(name)
+        if mat is None:
+            mat = bpy.data.materials.new(name=name)
+            self.materials[name] = mat
+        if link_textures:
+            self.textured.add(name)
+        return mat
+
+    def image(self, name):
+        if name not in self.images:
+            image = None
+            digest = self.tex_hashes.get(name)
+            if digest is not None:
+                if self.cached_images is None:
+                    self.cached_images = hashed_ids(bpy.data.images)
+                image = self.cached_images.get(digest)
+                tex = self.tex_data.get(name)
+                texpath = os.path.join(os.path.dirname(self.settings.filepath), name[:-4] + ".dds")
+                if image is None and tex is not None:
+                    with PROFILE.stage("load texture", bytes=len(tex.bitmap)) as stage:
+                        image = pixel_image(name[:-4], decode_dxt(tex))
+                        stage.add(pixels=tex.width * tex.height)
+                elif image is None and os.path.exists(texpath):
+                    with PROFILE.stage("load texture", bytes=os.path.getsize(texpath)):
+                        image = bpy.data.images.load(texpath)
+                if image is not None and image.get(HASH_PROP) is None:
+                    image[HASH_PROP] = digest
+                    self.cached_images[digest] = image
+            self.images[name] = image
+        return self.images[name]
+
+    def finish(self):
+        # .tex entries can come after the meshes in the directory, so this waits for the whole milo
+        cached = hashed_ids(bpy.data.materials)
+        for name, mat in self.materials.items():
+            try:
+                if name not in self.mats:
+                    # not in this milo, use whatever material already has the name
+                    existing = bpy.data.materials.get(name)
+                    if existing is not None and existing != mat:
+                        mat.user_remap(existing)
+                        bpy.data.materials.remove(mat)
+                    continue
+                data, digest = self.mats[name]
+                if data is None:
+                    continue
+                textured = name in self.textured
+                key = entry_hash(digest.encode('utf-8'), str(textured),
+                                 *(self.tex_hashes.get(getattr(data, field), "") for field, socket in MAT_TEX_INPUTS))
+                if key in cached:
+                    mat.user_remap(cached[key])
+                    bpy.data.materials.remove(mat)
+                    continue
+                if textured:
+                    build_material(mat, data, self.image)
+                mat[HASH_PROP] = key
+                cached[key] = mat
+            except Exception as e:
+                print(e)
+
+def read_faces(f, endian):
+    # Face table as one (FaceCount, 3) view, then steps over the group sizes (one byte each)
+    FaceCount = struct.unpack(endian + 'I', f.read(4))[0]
+    raw = f.read(FaceCount * 6)
+    if len(raw) != FaceCount * 6:
+        raise struct.error("face table cut short")
+    Faces = np.frombuffer(raw, dtype=endian + 'u2').reshape(FaceCount, 3).astype(np.uint16)
+    GroupSizesCount = struct.unpack(endian + 'I', f.read(4))[0]
+    f.seek(GroupSizesCount, 1)
+    return Faces
+
+def read_mesh(self, filename, file, basename):
     f = io.BytesIO(file)
     if self.little_endian_setting:
         Version = l_int(f)
@@ -477,12 +1277,12 @@ def Mesh(self, context, filename, file, basename, MatTexNames, MatTexFiles):
         elif Version == 28 and basename.endswith('.milo_ps2'):
             if self.shadow_setting:
                 if "shadow" in filename:
-                    return
+                    return None
             f.seek(17)
         else:
             if self.shadow_setting:
                 if "shadow" in filename:
-                    return
+                    return None
             f.seek(21)
         LocalTFM = struct.unpack('12f', f.read(48))
         WorldTFM = struct.unpack('12f', f.read(48))
@@ -508,55 +1308,12 @@ def Mesh(self, context, filename, file, basename, MatTexNames, MatTexFiles):
         MeshName = l_numstring(f)
         f.seek(9, 1)
         VertCount = l_int(f)
-        Verts = []
-        Normals = []
-        Weights = []
-        UVs = []
-        Indices = []
-        for i in range(VertCount):
-            if Version == 34:
-                try:
-                    x, y, z = struct.unpack('fff', f.read(12))
-                    Verts.append((x, y, z))
-                    nx, ny, nz = struct.unpack('fff', f.read(12))
-                    Normals.append((nx, ny, nz))
-                    w1, w2, w3, w4 = struct.unpack('ffff', f.read(16))
-                    u, v = struct.unpack('ff', f.read(8))
-                    Weights.append((w1, w2, w3, w4))
-                    UVs.append((u, v))
-                    b1, b2, b3, b4 = struct.unpack('HHHH', f.read(8))
-                    Indices.append((b1, b2, b3, b4))
-                    f.seek(16, 1)
-                except:
-                    x, y, z, w = struct.unpack('ffff', f.read(16))
-                    Verts.append((x, y, z))
-                    nx, ny, nz, nw = struct.unpack('ffff', f.read(16))
-                    Normals.append((nx, ny, nz))
-                    w1, w2, w3, w4 = struct.unpack('ffff', f.read(16))
-                    u, v = struct.unpack('ff', f.read(8))
-                    Weights.append((w1, w2, w3, w4))
-                    UVs.append((u, v))
-                    b1, b2, b3, b4 = struct.unpack('HHHH', f.read(8))
-                    Indices.append((b1, b2, b3, b4))
-                    f.seek(16, 1)
-            else:
-                x, y, z = struct.unpack('fff', f.read(12))
-                Verts.append((x, y, z))
-                nx, ny, nz = struct.unpack('fff', f.read(12))
-                Normals.append((nx, ny, nz))
-                w1, w2, w3, w4 = struct.unpack('ffff', f.read(16))
-                u, v = struct.unpack('ff', f.read(8))
-                Weights.append((w1, w2, w3, w4))
-                UVs.append((u, v))
-                IDs = 0, 1, 2, 3
-                Indices.append(IDs)
-        FaceCount = l_int(f)
-        Faces = []
-        for x in range(FaceCount):
-            Faces.append(struct.unpack('HHH', f.read(6)))
-        GroupSizesCount = l_int(f)
-        for x in range(GroupSizesCount):
-            f.read(1)
+        if Version == 34:
+            layout = pick_vert_layout(f, VertCount, LE_VERTS_34, LE_VERTS_34_W)
+        else:
+            layout = LE_VERTS
+        Verts, Normals, Weights, UVs, Indices = read_verts(f, layout, VertCount)
+        Faces = read_faces(f, '<')
         if Version < 34:
             BoneNames = []
             Int = l_int(f)
@@ -572,105 +1329,24 @@ def Mesh(self, context, filename, file, basename, MatTexNames, MatTexFiles):
             for x in range(BoneCount):
                 BoneNames.append(l_numstring(f))
                 TFM = struct.unpack('12f', f.read(48))
-        mesh = bpy.data.meshes.new(name=filename)
-        obj = bpy.data.objects.new(filename, mesh)
-        bpy.context.scene.collection.objects.link(obj)
-        obj.matrix_world = mathutils.Matrix((
-            (WorldTFM[0], WorldTFM[3], WorldTFM[6], WorldTFM[9],),
-            (WorldTFM[1], WorldTFM[4], WorldTFM[7], WorldTFM[10],),
-            (WorldTFM[2], WorldTFM[5], WorldTFM[8], WorldTFM[11],),
-            (0.0, 0.0, 0.0, 1.0),
-        ))
-        mesh.from_pydata(Verts, [], Faces)
-        mesh.use_auto_smooth = True
-        uv_layer = mesh.uv_layers.new(name="UVMap")
-        for face in mesh.polygons:
-            face.use_smooth = True
-            for loop_index in face.loop_indices:
-                vertex_index = mesh.loops[loop_index].vertex_index
-                uv = UVs[vertex_index]
-                flip = (uv[0], 1 - uv[1])
-                uv_layer.data[loop_index].uv = flip
-        mesh.normals_split_custom_set_from_vertices(Normals)
-        mesh.update()
-        bpy.ops.object.select_all(action='DESELECT')
-        obj.select_set(True)
-        bpy.context.view_layer.objects.active = obj
-        try:
-            for i, vertex in enumerate(mesh.vertices):
-                group_names = [BoneNames[idx] for idx in Indices[i]]
-                group_weights = Weights[i]
-                group_names = [name if name else "Group" for name in group_names]                            
-                for group_name, weight in zip(group_names, group_weights):
-                    if group_name not in obj.vertex_groups:
-                        obj.vertex_groups.new(name=group_name)
-                    group_index = obj.vertex_groups[group_name].index
-                    obj.vertex_groups[group_index].add([vertex.index], weight, 'ADD')
-            mesh.update()
-            print("Bone weights assigned to:", obj.name, group_index)                
-        except IndexError:
-            print("Indices don't match up!")
-        obj.select_set(False)                                   
-        if len(MatName) > 0:
-            mat = bpy.data.materials.get(MatName)
-            if mat is None:
-                mat = bpy.data.materials.new(name=MatName)
-            obj = bpy.context.active_object
-            if obj:
-                if obj.data.materials:
-                    obj.data.materials[0] = mat
-                else:
-                    obj.data.materials.append(mat)    
-        if Version == 28 and basename.endswith('.milo_xbox'):
-            for name, file in zip(MatTexNames, MatTexFiles):
-                if name.endswith('.tex'):
-                    texture = bpy.data.textures.new(name=name, type='IMAGE')
-                    base_folder = os.path.dirname(self.filepath)
-                    texpath = os.path.join(base_folder, name[:-4] + ".dds")
-                    if os.path.exists(texpath):
-                        image = bpy.data.images.load(texpath)
-                        texture.image = image
-                elif name.endswith('.mat'):
-                    mat = bpy.data.materials.get(name)
-                    if mat:
-                        f = io.BytesIO(file)
-                        f.seek(101)
-                        TexName = l_numstring(f)
-                        tex = bpy.data.textures.get(TexName)
-                        if tex:
-                            if not mat.use_nodes:
-                                mat.use_nodes = True
-                            bsdf = mat.node_tree.nodes.get("Principled BSDF")
-                            if bsdf:
-                                tex_node = mat.node_tree.nodes.new('ShaderNodeTexImage')
-                                tex_node.image = tex.image
-                                links = mat.node_tree.links
-                                links.new(bsdf.inputs['Base Color'], tex_node.outputs['Color'])            
-                        else:
-                            f.seek(21)
-                            r = l_float(f)
-                            g = l_float(f)
-                            b = l_float(f)
-                            a = l_float(f)
-                            mat.diffuse_color = (r, g, b, a)
     else:
-        print(filename)
+        debug(filename)
         Version = b_int(f)
         if Version == 37 and basename.endswith('.milo_wii') and self.low_lod_setting and self.shadow_setting:
             if "LOD01" in filename:
-                return
+                return None
             if "shadow" in filename:
-                return
+                return None
         else:
             if self.low_lod_setting and self.shadow_setting:
                 if Version == 37:
                     if "LOD01" in filename or "LOD02" in filename:
-                        return
+                        return None
                 else:
                     if "lod01" in filename or "lod02" in filename:
-                        return
+                        return None
                 if "shadow" in filename:
-                    return                    
+                    return None
         f.seek(21)
         LocalTFM = struct.unpack('>12f', f.read(48))
         WorldTFM = struct.unpack('>12f', f.read(48))
@@ -686,513 +1362,130 @@ def Mesh(self, context, filename, file, basename, MatTexNames, MatTexFiles):
         MeshName = b_numstring(f)
         f.seek(9, 1)
         VertCount = b_int(f)
+        VertSize = 0
         if Version > 34:
             Platform = struct.unpack('>B', f.read(1))[0]
             if Platform == 1:
-                f.seek(8, 1)
-        Verts = []
-        Normals = []
-        Weights = []
-        UVs = []
-        Indices = []
-        for i in range(VertCount):
+                VertSize = b_int(f)
+                f.seek(4, 1)
+        layout = None
 #lego rockband
-            if Version == 34 and basename.endswith('.milo_xbox'):
-                x, y, z, w = struct.unpack('>ffff', f.read(16))
-                Verts.append((x, y, z))                
-                nx, ny, nz, nw = struct.unpack('>ffff', f.read(16))
-                Normals.append((nx, ny, nz))
-                w1, w2, w3, w4 = struct.unpack('>ffff', f.read(16))
-                Weights.append((w1, w2, w3, w4))
-                u, v = struct.unpack('>ff', f.read(8))
-                UVs.append((u, v))
-                b1, b2, b3, b4 = struct.unpack('>HHHH', f.read(8))
-                Indices.append((b1, b2, b3, b4))
-                f.seek(16, 1)
-            if (Version == 36 or Version == 37) and basename.endswith('.milo_wii'):
-                x, y, z = struct.unpack('>fff', f.read(12))
-                Verts.append((x, y, z))
-                nx, ny, nz = struct.unpack('>fff', f.read(12))
-                Normals.append((nx, ny, nz))
-                w1, w2, w3, w4 = struct.unpack('>ffff', f.read(16))
-                Weights.append((w1, w2, w3, w4))
-                u, v = struct.unpack('>ff', f.read(8))
-                UVs.append((u, v))
-                b1, b2, b3, b4 = struct.unpack('>HHHH', f.read(8))
-                Indices.append((b1, b2, b3, b4))
-                f.seek(16, 1)
-#                           TBRB             GDRB
-            elif (Version == 36 or Version == 37) and basename.endswith('.milo_ps3'):
-               # print("MILO_PS3 format", "mesh version", Version)
-                x, y, z = struct.unpack('>fff', f.read(12))
-                Verts.append((x, y, z))
-                u, v = struct.unpack('>ee', f.read(4))
-                UVs.append((u, v))
-               # no normals on ps3
-               # nx, ny, nz, nw = struct.unpack('>fff', f.read(12))
-               # Normals.append((nx, ny, nz, nw))
-               # no normals on ps3
-                f.seek(8, 1)
-#  / 255
-                w11, w22, w33, w44 = struct.unpack('>BBBB', f.read(4))
-                w1 = w11 / 255.0
-                w2 = w22 / 255.0
-                w4 = w33 / 255.0
-                w3 = w44 / 255.0
-                Weights.append((w1, w2, w3, w4))
-               # Weights.append((w1, w2, w3, w4))
-                b1, b2, b3, b4 = struct.unpack('>HHHH', f.read(8))
-               # b1 = struct.unpack('H', f.read(2))
-               # b2 = struct.unpack('H', f.read(2))
-               # b3 = struct.unpack('H', f.read(2))
-               # b4 = struct.unpack('H', f.read(2))
-                Indices.append((b1, b2, b3, b4))
-                print("weights", w1, w2, w3, w4, "bone ids", b1, b2, b3, b4)
+        if Version == 34 and basename.endswith('.milo_xbox'):
+            layout = BE_VERTS_34_XBOX
 #                           TBRB             GDRB
-            elif (Version == 36 or Version == 37) and basename.endswith('.milo_xbox'):
-                x, y, z = struct.unpack('>fff', f.read(12))
-                Verts.append((x, y, z))
-                f.seek(4, 1)
-                u, v = struct.unpack('>ee', f.read(4))
-                UVs.append((u, v))
-                normalv = b_int(f)
-                nx = float(normalv & 1023) / float(1023)
-                ny = float((normalv >> 10) & 1023) / float(1023)
-                nz = float((normalv >> 20) & 1023) / float(1023)
-                nw = float((normalv >> 30) & 3) / float(3)
-                Normals.append((nx, ny, nz))
-       #         w_bits = (normalv >> 30) & 3
-       #         z_bits = (normalv >> 20) & 1023
-       #         y_bits = (normalv >> 10) & 1023
-       #         x_bits = normalv & 1023
-       #         if x_bits > 512:
-       #             x_bits = -1 * (~((x_bits - 1) & (1023 >> 1)))
-       #         if y_bits > 512:
-       #             y_bits = -1 * (~((y_bits - 1) & (1023 >> 1)))
-       #         if z_bits > 512:
-       #             z_bits = -1 * (~((z_bits - 1) & (1023 >> 1)))
-       #         if w_bits > 1:
-       #             w_bits = -1 * (~((w_bits - 1) & (3 >> 1)))
-                f.seek(4, 1)
-                weightv = b_int(f)
-                Ww_bits = (weightv >> 30) & 3
-                Wz_bits = (weightv >> 20) & 1023
-                Wy_bits = (weightv >> 10) & 1023
-                Wx_bits = weightv & 1023
-                w1 = float(Wx_bits) / float(1023)
-                w2 = float(Wy_bits) / float(1023)
-                w3 = float(Wz_bits) / float(1023)
-                w4 = float(Ww_bits) / float(3)
-                Weights.append((w1, w2, w3, w4))
-               # Weights = ((w1, w2, w3, w4))
-               # Weights.append((w1))
-               # Weights.append((w2))
-               # Weights.append((w3))
-               # Weights.append((w4))
-                b1, b2, b3, b4 = struct.unpack('>BBBB', f.read(4))
-                Indices.append((b1, b2, b3, b4))
-               # print("weightv", weightv, "wzyxbits", Ww_bits, Wz_bits, Wy_bits, Wx_bits, "xyzwweight", wx, wy, wz, ww, "bones", b1, b2, b3, b4, "xyz", x, y, z)
-            if Version == 38 and basename.endswith('.milo_ps3'):
-                x, y, z = struct.unpack('>fff', f.read(12))
-                Verts.append((x, y, z))
-                u, v = struct.unpack('>ee', f.read(4))
-                UVs.append((u, v))
-                f.seek(8, 1)
-                w1, w2, w3, w4 = struct.unpack('>BBBB', f.read(4))
-                Weights.append((w1 / 255.0, w2 / 255.0, w3 / 255.0, w4 / 255.0))
-                f.seek(4, 1)
-                b1, b2, b3, b4 = struct.unpack('>HHHH', f.read(8))
-                Indices.append((b1, b2, b3, b4))
-            elif Version == 38 and basename.endswith('.milo_xbox'):
-                x, y, z = struct.unpack('>fff', f.read(12))
-                Verts.append((x, y, z))
-                u, v = struct.unpack('>ee', f.read(4))
-                UVs.append((u, v))
-                f.seek(8, 1)
-                w1, w2, w3, w4 = struct.unpack('>BBBB', f.read(4))
-                Weights.append((w1 / 255.0, w2 / 255.0, w3 / 255.0, w4 / 255.0))
-                f.seek(4, 1)
-                b1, b2, b3, b4 = struct.unpack('>BBBB', f.read(4))
-                Indices.append((b1, b2, b3, b4))            
-            elif Version == 38 and VertSize != 40:
-                x, y, z = struct.unpack('>fff', f.read(12))
-                Verts.append((x, y, z))
-                f.seek(16, 1)
-                nx, ny, nz = struct.unpack('>fff', f.read(12))
-                Normals.append((nx, ny, nz))
-                u, v = struct.unpack('>ff', f.read(8))
-                UVs.append((u, v))
-                w1, w2, w3, w4 = struct.unpack('>ffff', f.read(16))
-                Weights.append((w1, w2, w3, w4))
-                b1, b2, b3, b4 = struct.unpack('>HHHH', f.read(8))
-                Indices.append((b1, b2, b3, b4))
-                f.seek(16, 1)
-        FaceCount = b_int(f)
-        Faces = []
-        for x in range(FaceCount):
-            Faces.append(struct.unpack('>HHH', f.read(6)))
-        GroupSizesCount = b_int(f)
-        for x in range(GroupSizesCount):
-            f.read(1)
+        elif (Version == 36 or Version == 37) and basename.endswith('.milo_wii'):
+            layout = BE_VERTS_WII
+        elif (Version == 36 or Version == 37) and basename.endswith('.milo_ps3'):
+            layout = BE_VERTS_PS3
+        elif (Version == 36 or Version == 37) and basename.endswith('.milo_xbox'):
+            layout = BE_VERTS_XBOX
+        elif Version == 38 and basename.endswith('.milo_ps3'):
+            layout = BE_VERTS_38_PS3
+        elif Version == 38 and basename.endswith('.milo_xbox'):
+            layout = BE_VERTS_38_XBOX
+        elif Version == 38 and VertSize != 40:
+            layout = BE_VERTS_38
+        Verts, Normals, Weights, UVs, Indices = read_verts(f, layout, VertCount)
+        if layout is BE_VERTS_PS3:
+            # 3rd and 4th weight bytes are swapped on ps3
+            Weights = Weights[:, [0, 1, 3, 2]]
+        # influences are stored last to first on these platforms
+        Weights = Weights[:, ::-1]
+        Faces = read_faces(f, '>')
         BoneNames = []
         BoneCount = b_int(f)
         for x in range(BoneCount):
             BoneNames.append(b_numstring(f))
             TFM = struct.unpack('>12f', f.read(48))
-# not basename.endswith('.milo_wii')
-        if (Version == 36 or Version == 37) and basename.endswith('.milo_xbox'):
-            index = 0
-            for Normal in Normals:
-                w_bits = (normalv >> 30) & 3
-                z_bits = (normalv >> 20) & 1023
-                y_bits = (normalv >> 10) & 1023
-                x_bits = normalv & 1023
-                if x_bits > 512:
-                    x_bits = -1 * (~((x_bits - 1) & (1023 >> 1)))
-                if y_bits > 512:
-                    y_bits = -1 * (~((y_bits - 1) & (1023 >> 1)))
-                if z_bits > 512:
-                    z_bits = -1 * (~((z_bits - 1) & (1023 >> 1)))
-                if w_bits > 1:
-                    w_bits = -1 * (~((w_bits - 1) & (3 >> 1)))
-                x = max(x_bits / float(512), -1.0)
-                y = max(y_bits / float(512), -1.0)
-                z = max(z_bits / float(512), -1.0)
-                w = max(w_bits / float(1), -1.0)
-                Normals[index] = (x, y, z)
-                index += 1
-       # if (Version == 36 or Version == 37) and not basename.endswith('.milo_wii'):
-       #     index = 0
-       #     for Weight in Weights:
-       #         w_bits = (weightv >> 30) & 3
-       #         z_bits = (weightv >> 20) & 1023
-       #         y_bits = (weightv >> 10) & 1023
-       #         x_bits = weightv & 1023
-       #         w1 = float((weightv & 1023) / float(1023))
-       #         w2 = float((weightv >> 10) & 1023) / float(1023)
-       #         w3 = float((weightv >> 20) & 1023) / float(1023)
-       #         w4 = float((weightv >> 30) & 3) / float(3)
-       #         Weights[index] = (w1, w2, w3, w4)
-       #         index += 1
-        mesh = bpy.data.meshes.new(name=filename)
-        obj = bpy.data.objects.new(filename, mesh)
-        bpy.context.scene.collection.objects.link(obj)
-        obj.matrix_world = mathutils.Matrix((
-            (WorldTFM[0], WorldTFM[3], WorldTFM[6], WorldTFM[9],),
-            (WorldTFM[1], WorldTFM[4], WorldTFM[7], WorldTFM[10],),
-            (WorldTFM[2], WorldTFM[5], WorldTFM[8], WorldTFM[11],),
-            (0.0, 0.0, 0.0, 1.0),
-        ))
-        mesh.from_pydata(Verts, [], Faces)
-        mesh.use_auto_smooth = True
-        uv_layer = mesh.uv_layers.new(name="UVMap")
-        for face in mesh.polygons:
-            if len(Normals) == 0:
-                face.use_smooth = True
-            for loop_index in face.loop_indices:
-                vertex_index = mesh.loops[loop_index].vertex_index
-                uv = UVs[vertex_index]
-                flip = (uv[0], 1 - uv[1])
-                uv_layer.data[loop_index].uv = flip
-        if len(Normals) > 0:
-            mesh.normals_split_custom_set_from_vertices(Normals)
+    return MeshData(filename, Version, np.array(WorldTFM, dtype=np.float32), MatName, Verts, Normals,
+                    np.ascontiguousarray(Weights), UVs, Indices, Faces, BoneNames)
+
+def tfm_matrix(TFM):
+    return mathutils.Matrix((
+        (TFM[0], TFM[3], TFM[6], TFM[9],),
+        (TFM[1], TFM[4], TFM[7], TFM[10],),
+        (TFM[2], TFM[5], TFM[8], TFM[11],),
+        (0.0, 0.0, 0.0, 1.0),
+    ))
+
+def mesh_key(data, smooth):
+    # Hash of everything that ends up in the mesh datablock, so equal ones can be shared
+    h = hashlib.blake2b(digest_size=16)
+    for array in (data.verts, data.normals, data.uvs, data.faces, data.weights, data.indices):
+        array = np.ascontiguousarray(array)
+        h.update(("%s%s" % (array.dtype.str, array.shape)).encode('utf-8'))
+        h.update(array.data)
+    h.update("\0".join(data.bone_names + [data.mat_name, str(smooth)]).encode('utf-8'))
+    return h.hexdigest()
+
+def build_mesh(self, context, data, basename, materials, meshes=None, collection=None):
+    # meshes maps mesh_key() to (mesh, vertex group names) of the meshes built so far. A mesh
+    # already in there only gets a new object linked to it. Returns True when that happened
+    Version = data.version
+    MatName = data.mat_name
+    smooth = self.little_endian_setting or len(data.normals) == 0
+    if collection is None:
+        collection = bpy.context.scene.collection
+    if meshes is not None:
+        key = mesh_key(data, smooth)
+        if key in meshes:
+            mesh, group_names = meshes[key]
+            obj = bpy.data.objects.new(data.name, mesh)
+            collection.objects.link(obj)
+            obj.matrix_world = tfm_matrix(data.world.tolist())
+            # the weights are in the mesh, the groups they refer to by index are per object
+            for name in group_names:
+                obj.vertex_groups.new(name=name)
+            return True
+    mesh = bpy.data.meshes.new(name=data.name)
+    obj = bpy.data.objects.new(data.name, mesh)
+    collection.objects.link(obj)
+    obj.matrix_world = tfm_matrix(data.world.tolist())
+    fill_mesh(mesh, data.verts, data.faces, data.uvs, smooth)
+    mesh.use_auto_smooth = True
+    if len(data.normals) > 0:
+        mesh.normals_split_custom_set_from_vertices(data.normals)
+    mesh.update()
+    bpy.ops.object.select_all(action='DESELECT')
+    obj.select_set(True)
+    bpy.context.view_layer.objects.active = obj
+    with PROFILE.stage("weights", influences=data.indices.size):
+        weighted = assign_weights(obj, data.bone_names, data.indices, data.weights)
+    if weighted:
         mesh.update()
-        try:
-            bpy.ops.object.select_all(action='DESELECT')
-            obj.select_set(True)
-            bpy.context.view_layer.objects.active = obj
-            for i, vertex in enumerate(mesh.vertices):
-                group_name1, group_name2, group_name3, group_name4 = group_names = [BoneNames[idx] for idx in Indices[i]]
-               # print("bone names", BoneNames, "length", len(BoneNames))
-                w1, w2, w3, w4 = Weights[i]
-               # Weights[i] = w1, w2, w3, w4
-               # w1, w2, w3, w4 =  w1, w2, w3, w4
-           # if len(BoneNames) == 1 
-           # just do one of these
-                for group_name in (group_names):
-                   # print("weight encoding")
-                    if group_name1 not in obj.vertex_groups:
-                        obj.vertex_groups.new(name=group_name1)
-                    group_index = obj.vertex_groups[group_name1].index
-                    obj.vertex_groups[group_name1].add([vertex.index], w4, 'ADD')
-                   # print("name", group_name1, "weight4", w4)
-
-                    if group_name2 not in obj.vertex_groups:
-                        obj.vertex_groups.new(name=group_name2)
-                    group_index = obj.vertex_groups[group_name2].index
-                    obj.vertex_groups[group_name2].add([vertex.index], w3, 'ADD')
-                   # print("name", group_name2, "weight3", w3)
-
-                    if group_name3 not in obj.vertex_groups:
-                        obj.vertex_groups.new(name=group_name3)
-                    group_index = obj.vertex_groups[group_name3].index
-                    obj.vertex_groups[group_name3].add([vertex.index], w2, 'ADD')
-                   # print("name", group_name3, "weight2", w2)
-
-                    if group_name4 not in obj.vertex_groups:
-                        obj.vertex_groups.new(name=group_name4)
-                    group_index = obj.vertex_groups[group_name4].index
-                    obj.vertex_groups[group_name4].add([vertex.index], w1, 'ADD')
-                   # print("name", group_name4, "weight1", w1)
-
-
-                   # print("group_names1", group_names[1], "group_names2", group_names[2],"group_name", group_name, "vertex.index", vertex.index, "4321weight", w4, w3, w2, w1)
-                   # print("groups", group_name1, group_name2, group_name3, group_name4, "vertex", vertex.index, "weightv", weightv, "wzyxbits", Wx_bits, Wy_bits, Wz_bits, Ww_bits, "1234weight", w1, w2, w3, w4, "xyz", x, y, z)
-#  "bone", b1, b2, b3, b4,
-                   # print("vertex", vertex.index, "weightv", weightv, "xbits", Wx_bits, "1weight", w1, "bone", b1, b2, b3, b4, "xyz", x, y, z)
-
-            mesh.update()
-            print("Bone weights assigned to:", obj.name, group_index)                
-            obj.select_set(False)
-        except:
-            print("Indices don't match up!")
-            print("BoneName length", BoneNames, len(BoneNames))
-
-        if len(MatName) > 0:
-            bpy.context.view_layer.objects.active = obj
-            mat = bpy.data.materials.get(MatName)
-            if mat is None:
-                mat = bpy.data.materials.new(name=MatName)
-            obj = bpy.context.active_object
-            if obj:
-                if obj.data.materials:
-                    obj.data.materials[0] = mat
-                else:
-                    obj.data.materials.append(mat)    
-        if not basename.endswith('.milo_wii'):
-            for name, file in zip(MatTexNames, MatTexFiles):
-                if name.endswith('.tex'):
-                    texture = bpy.data.textures.new(name=name, type='IMAGE')
-                    base_folder = os.path.dirname(self.filepath)
-                    texpath = os.path.join(base_folder, name[:-4] + ".dds")
-                    if os.path.exists(texpath):
-                        image = bpy.data.images.load(texpath)
-                        texture.image = image
-                elif name.endswith('.mat'):
-                    mat = bpy.data.materials.get(name)
-                    if mat:
-                        f = io.BytesIO(file)
-                        Version = b_int(f)
-                        if Version == 28:
-                            f.seek(21)
-                            r = b_float(f)
-                            g = b_float(f)
-                            b = b_float(f)
-                            a = b_float(f)
-                            mat.diffuse_color = (r, g, b, a)
-                           # f.seek(101)
-                            TexName = b_numstring(f)
-                            tex = bpy.data.textures.get(TexName)
-                            if tex:
-                                if not mat.use_nodes:
-                                    mat.use_nodes = True
-                                bsdf = mat.node_tree.nodes.get("Principled BSDF")
-                                if bsdf:
-                                    tex_node = mat.node_tree.nodes.new('ShaderNodeTexImage')
-                                    tex_node.image = tex.image
-                                    links = mat.node_tree.links
-                                    links.new(bsdf.inputs['Base Color'], tex_node.outputs['Color'])                        
-                        else:
-                 # version size + metadata size + blend size = file seek number/9+10=21
-                           # blend = b_float(f)
-   # 4h/ 00 00 00 00/01/02/03/04/05/06
-   # kBlendDest,             00
-   # kBlendSrc,              01
-   # kBlendAdd,              02
-   # kBlendSrcAlpha,         03
-   # kBlendSubtract,         04
-   # kBlendMultiply,         05
-   # kPreMultAlpha,          06
-                            f.seek(21)
-                            r = b_float(f)
-                            g = b_float(f)
-                            b = b_float(f)
-                            a = b_float(f)
-                            mat.diffuse_color = (r, g, b, a)
-                            print("diff rgb", r, g, b)
-                            alpha = b_float(f)
-                            prelit = b_bool(f)
-                            use_environ = b_bool(f)
-                            z_mode = b_float(f)
-   # 4h/ 00 00 00 00/01/02/03/04
-   # kZModeDisable,         00
-   # kZModeNormal,          01
-   # kZModeTransparent,     02
-   # kZModeForce,           03
-   # kZModeDecal,           04
-                            alpha_cut = b_bool(f)
-                            alpha_threshold = l_int(f)
-                            alpha_write = b_bool(f)
-                            tex_gen = b_float(f)
-   # 4h/ 00 00 00 00/01/02/03/04/05
-   # kTexGenNone,           00
-   # kTexGenXfm,            01
-   # kTexGenSphere,         02
-   # kTexGenProjected,      03
-   # kTexGenXfmOrigin,      04
-   # kTexGenEnviron,        05
-                            tex_wrap = b_float(f)
-   # 4h/ 00 00 00 00/01/02/03/04
-   # kTexWrapClamp,         00
-   # kTexWrapRepeat,        01
-   # kTexBorderBlack,       02
-   # kTexBorderWhite,       03
-   # kTexWrapMirror,        04
-                           # tex_xfm = 30h MATRIX
-                         # skip tex xfm. WE DONT NEED IT
-                            f.seek(30)
-                            f.seek(105)
-                     # DIFFUSE TEXTURE
-                            TexName = b_numstring(f)
-                            tex = bpy.data.textures.get(TexName)
-                            print("material", MatName, "DIFF TEX name", TexName)
-                            if tex:
-                                if not mat.use_nodes:
-                                    mat.use_nodes = True
-                                bsdf = mat.node_tree.nodes.get("Principled BSDF")
-                                if bsdf:
-                                    tex_node = mat.node_tree.nodes.new('ShaderNodeTexImage')
-                                    tex_node.image = tex.image
-                                    links = mat.node_tree.links
-                                    links.new(bsdf.inputs['Base Color'], tex_node.outputs['Color'])
-                                                      # BSDF input#1
-                                    links.new(bsdf.inputs['Alpha'], tex_node.outputs['Alpha'])
-                                                      # BSDF input#4
-                            next_pass = b_numstring(f)
-                            intensify = b_bool(f)
-                            cull = b_bool(f)
-                            emissive_multiplier = b_float(f)
-                           # f.seek(10, 1)
-                           # specular rgb
-                            r = b_float(f)
-                            g = b_float(f)
-                            b = b_float(f)
-                            mat.specular_color = (r, g, b)
-                            print("spec rgb", r, g, b)
-                            specular_power = b_float(f)
-                          # most milos have this set to tex.tex
-                            normal_map = b_numstring(f)
-                       # emissive_map
-                       # BSDF input #26 on blender 4
-                            EMTexName = b_numstring(f)
-                            tex = bpy.data.textures.get(EMTexName)
-                            print("EMISSIVE TEX name", EMTexName)
-                            if tex:
-                                if not mat.use_nodes:
-                                    mat.use_nodes = True
-                                bsdf = mat.node_tree.nodes.get("Principled BSDF")
-                                if bsdf:
-                                    tex_node = mat.node_tree.nodes.new('ShaderNodeTexImage')
-                                    tex_node.image = tex.image
-                                    links = mat.node_tree.links
-                                    links.new(bsdf.inputs['Emission'], tex_node.outputs['Color'])
-                       # specular_map
-                       # BSDF input #13 on blender 4
-                       # BSDF Specular on blender 3
-                           # f.seek(167)
-                            SPECTexName = b_numstring(f)
-                            tex = bpy.data.textures.get(SPECTexName)
-                            print("SPEC TEX name", SPECTexName)
-                            if tex:
-                                if not mat.use_nodes:
-                                    mat.use_nodes = True
-                                bsdf = mat.node_tree.nodes.get("Principled BSDF")
-                                if bsdf:
-                                    tex_node = mat.node_tree.nodes.new('ShaderNodeTexImage')
-                                    tex_node.image = tex.image
-                                    links = mat.node_tree.links                   
-                                    links.new(bsdf.inputs['Specular'], tex_node.outputs['Color'])
-                                    # BSDF input#13 on blender 4/specular on blender 3
-                            environ_map = b_numstring(f)
-                           # reflection map??? just reuse the tex code from above^^^
-                            per_pixel_light = b_bool(f)
-                            stencil_mode = b_float(f)
-   # 4h/ 00 00 00 00/01/02
-   # kStencilIgnore,        00
-   # kStencilWrite,         01
-   # kStencilTest,          02
-                            fur = b_numstring(f)
-                            de_normal = b_float(f)
-                            anisotropy = b_float(f)
-                            norm_detail_tiling = b_float(f)
-                            norm_detail_strength = b_float(f)
-                       # norm_detail_map
-                       # BSDF input #5 on blender 4
-                            NTexName = b_numstring(f)
-                            tex = bpy.data.textures.get(NTexName)
-                            print("NORM TEX name", NTexName, "normal detail strength", norm_detail_strength)
-                            if tex:
-                                if not mat.use_nodes:
-                                    mat.use_nodes = True
-                                bsdf = mat.node_tree.nodes.get("Principled BSDF")
-                                if bsdf:
-                                    tex_node = mat.node_tree.nodes.new('ShaderNodeTexImage')
-                                    NORM_node = mat.node_tree.nodes.new('ShaderNodeNormalMap')
-                                    tex_node.image = tex.image
-                                    links = mat.node_tree.links
-                                   # TODO: make the strength value be 'norm_detail_strength'
-                                    links.new(NORM_node.inputs[1], tex_node.outputs['Color'])
-                                    links.new(bsdf.inputs['Normal'], NORM_node.outputs['Normal'])
-                                                      # BSDF input#5 on blender 4/normal on blender 3&4
-
-                            point_lights = b_bool(f)
-                            proj_lights = b_bool(f)
-                            fog = b_bool(f)
-                            fade_out = b_bool(f)
-                            color_adjust = b_bool(f)
-             #               rim_rgb
-                          #  r = b_float(f)
-                          #  g = b_float(f)
-                          #  b = b_float(f)
-                          #  mat.rim_color = (r, g, b)
-                          #  rim_power = b_float(f)
-                          #  rim_map = b_numstring(f)
-             # rim???? outer glow/outline glow??? just reuse the tex code from above^^^
-             # if we can even do that
-                          #  rim_always_show = b_bool(f)
-                          #  screen_aligned = b_bool(f)
-                          #  shader_varition = b_float(f)
-   # 4h/ 00 00 00 00/01/02
-   # kShaderVariationNone,  00
-   # kShaderVariationSkin,  01
-   # kShaderVariationHair,  02
-             #               specular2_rgb
-                          #  r = b_float(f)
-                          #  g = b_float(f)
-                          #  b = b_float(f)
-                          #  mat.specular2_color = (r, g, b)
-                          #  val_0x160 = b_float(f)
-                          #  val_0x170 = b_float(f)
-                          #  val_0x174 = b_float(f)
-                          #  val_0x178 = b_float(f)
-                          #  val_0x17c = b_float(f)
-             #               five weird varibles
-                          #  alpha_mask = b_numstring(f)
-                          #  ps3_force_trilinear = b_bool(f)
-             #  weird this is in xbox milos^
-                            
-def Trans(basename, self, filename, file):        
+        debug("Bone weights assigned to:", obj.name, len(obj.vertex_groups))
+    else:
+        print("Indices don't match up!")
+        print("BoneName length", data.bone_names, len(data.bone_names))
+    obj.select_set(False)
+    if len(MatName) > 0:
+        if self.little_endian_setting:
+            link_textures = Version == 28 and basename.endswith('.milo_xbox')
+        else:
+            link_textures = not basename.endswith('.milo_wii')
+        mat = materials.material(MatName, link_textures)
+        if obj.data.materials:
+            obj.data.materials[0] = mat
+        else:
+            obj.data.materials.append(mat)
+    if meshes is not None:
+        meshes[key] = (mesh, [group.name for group in obj.vertex_groups])
+    return False
+
+def read_trans(self, filename, file, basename):
     f = io.BytesIO(file)
     if self.little_endian_setting:
         Version = l_int(f)
         if Version == 8:
             f.seek(8)
-            LocalUpper = struct.unpack('9f', f.read(36))
-            LocalPos = struct.unpack('3f', f.read(12))
-            WorldUpper = struct.unpack('9f', f.read(36))
-            WorldPos = struct.unpack('3f', f.read(12))
-        elif Version == 9 and basename.endswith('.milo_xbox'):
-            f.seek(17)
-            LocalUpper = struct.unpack('9f', f.read(36))
-            LocalPos = struct.unpack('3f', f.read(12))
-            WorldUpper = struct.unpack('9f', f.read(36))
-            WorldPos = struct.unpack('3f', f.read(12))
-        elif Version == 9 and basename.endswith('.milo_ps2'):
+        elif Version == 9 and (basename.endswith('.milo_xbox') or basename.endswith('.milo_ps2')):
             f.seek(17)
-            LocalUpper = struct.unpack('9f', f.read(36))
-            LocalPos = struct.unpack('3f', f.read(12))
-            WorldUpper = struct.unpack('9f', f.read(36))
-            WorldPos = struct.unpack('3f', f.read(12))
+        else:
+            return None
+        LocalUpper = struct.unpack('9f', f.read(36))
+        LocalPos = struct.unpack('3f', f.read(12))
+        WorldUpper = struct.unpack('9f', f.read(36))
+        WorldPos = struct.unpack('3f', f.read(12))
         if Version == 8:
             TransCount = l_int(f)
             for x in range(TransCount):
@@ -1215,223 +1508,128 @@ def Trans(basename, self, filename, file):
         Target = b_numstring(f)
         f.seek(1, 1)
         ParentName = b_numstring(f)
-    if "Armature" in bpy.data.armatures:
-        armature_data = bpy.data.armatures["Armature"]
-    else:
-        armature_data = bpy.data.armatures.new("Armature")
-    if "Armature" in bpy.data.objects:
-        armature_obj = bpy.data.objects["Armature"]
-    else:
-        armature_obj = bpy.data.objects.new("Armature", armature_data)
-        bpy.context.scene.collection.objects.link(armature_obj)
-        bpy.ops.mesh.primitive_ico_sphere_add()
-        bpy.ops.mesh.primitive_cube_add()
-        bpy.ops.object.empty_add(type='PLAIN_AXES')
-
-
+    return TransData(filename, ParentName, LocalUpper, LocalPos, WorldUpper, WorldPos)
 
+# every Trans entry of every import goes into this one armature
 # make skeleton have file name instead
 # useful for GDRB
 #    if Basename in bpy.data.armatures:
 #        armature_data = bpy.data.armatures[Basename]
 #    else:
 #        armature_data = bpy.data.armatures.new(Basename)
-#    if Armature in bpy.data.objects:
-#        armature_obj = bpy.data.objects[Basename]
-#    else:
-#        armature_obj = bpy.data.objects.new(Basename, armature_data)
-#        bpy.context.scene.collection.objects.link(armature_obj)
-#
-
-    bpy.context.view_layer.objects.active = armature_obj
-    bpy.ops.object.mode_set(mode='EDIT')
-    edit_bone = armature_obj.data.edit_bones.get(filename)
-    if edit_bone is None:
-        edit_bone = armature_obj.data.edit_bones.new(filename)
-        edit_bone.head = (0, 0, 0)
-        edit_bone.tail = (0, 1, 0)
-        edit_bone.use_deform = True
-    parent_bone = armature_obj.data.edit_bones.get(ParentName)
-    if parent_bone is None:
-        parent_bone = armature_obj.data.edit_bones.new(ParentName)
-        parent_bone.head = (0, 0, 0)
-        parent_bone.tail = (0, 1, 0)
-        parent_bone.use_deform = True
-    if parent_bone:
-        edit_bone.parent = parent_bone
-    bpy.ops.object.mode_set(mode='POSE')
-    pose_bone = armature_obj.pose.bones.get(filename)
-    if pose_bone:
-       # if "hair" in filename:
-       #     bpy.ops.object.mode_set(mode='POSE')
-       #     pose_bone.matrix = mathutils.Matrix((
-       #         (WorldUpper[0], WorldUpper[3], WorldUpper[6], 0.0),
-       #         (WorldUpper[1], WorldUpper[4], WorldUpper[7], 0.0),
-       #         (WorldUpper[2], WorldUpper[5], WorldUpper[8], 0.0),
-       #         (0.0, 0.0, 0.0, 1.0),
-       #     ))
-       #     pose_bone.location = LocalPos
-       # if "hair" in ParentName:
-       #     bpy.ops.object.mode_set(mode='POSE')
-       #     pose_bone.matrix = mathutils.Matrix((
-       #         (WorldUpper[0], WorldUpper[3], WorldUpper[6], 0.0),
-       #         (WorldUpper[1], WorldUpper[4], WorldUpper[7], 0.0),
-       #         (WorldUpper[2], WorldUpper[5], WorldUpper[8], 0.0),
-       #         (0.0, 0.0, 0.0, 1.0),
-       #     ))
-       #     pose_bone.location = LocalPos
-      #  if "spine" in filename:
-      #      bpy.ops.object.mode_set(mode='POSE')
-      #      pose_bone.matrix_basis = mathutils.Matrix((
-      #          (WorldUpper[0], WorldUpper[3], WorldUpper[6], 0.0),
-      #          (WorldUpper[1], WorldUpper[4], WorldUpper[7], 0.0),
-      #          (WorldUpper[2], WorldUpper[5], WorldUpper[8], 0.0),
-      #          (0.0, 0.0, 0.0, 1.0),
-      #      ))
-      #      pose_bone.location = LocalPos
-      #  else:
-#^^^^^^^^^OLD PROBABLY UNNEEDED CODE^^^^^^^^^^^
-        pose_bone.matrix_basis = mathutils.Matrix((
-            (LocalUpper[0], LocalUpper[3], LocalUpper[6], 0.0),
-            (LocalUpper[1], LocalUpper[4], LocalUpper[7], 0.0),
-            (LocalUpper[2], LocalUpper[5], LocalUpper[8], 0.0),
-            (0.0, 0.0, 0.0, 1.0),
-        ))
-        pose_bone.location = LocalPos
-# BONE SHAPES
-# BONE SHAPES
-# BONE SHAPES
-# BONE SHAPES
-# BONE SHAPES
+ARMATURE_NAME = "Armature"
+
 # BONE SHAPES
+# shape object and scale per bone, None for no shape.
+# Bones not listed get a small Icosphere, "spot" bones a thin Cube
+BONE_SHAPES = {
 # the three or four eye bones
-        if (filename == "bone_L-eye.mesh" or filename == "bone_R-eye.mesh"):
-            print("eye bone. No bone shape wanted")
-        elif (filename == "bone_L-eye_back.mesh" or filename == "bone_R-eye_back.mesh"):
-            print("eye bone. No bone shape wanted")
-        elif (filename == "bone_L-lid.mesh" or filename == "bone_R-lid.mesh"):
-            print("eyelid bone. No bone shape wanted")
-        elif (filename == "bone_L-eyelid-low.mesh" or filename == "bone_R-eyelid-low.mesh"):
-            print("eyelid bone. No bone shape wanted")
-
-        elif "spot" in filename:
-            bpy.data.objects['Armature'].pose.bones[filename].custom_shape = bpy.data.objects['Cube']
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[0] = 0.1
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[1] = 0.25
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[2] = 0.1
-
-        elif (filename == "bone_head_lookat.mesh"):
-            bpy.data.objects['Armature'].pose.bones[filename].custom_shape = bpy.data.objects['Cube']
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[0] = 0.4
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[1] = 0.1
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[2] = 0.1
-        elif (filename == "bone_eyes.mesh"):
-            bpy.data.objects['Armature'].pose.bones[filename].custom_shape = bpy.data.objects['Icosphere']
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[0] = 0.3
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[1] = 0.3
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[2] = 0.3
-
-        elif (filename == "bone_guitar.mesh"):
-            bpy.data.objects['Armature'].pose.bones[filename].custom_shape = bpy.data.objects['Cube']
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[0] = 0.5
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[1] = 0.5
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[2] = 0.5
-
-        elif (filename == "bone_jaw.mesh"):
-            bpy.data.objects['Armature'].pose.bones[filename].custom_shape = bpy.data.objects['Cube']
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[0] = 0.25
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[1] = 0.1
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[2] = 0.1
-
+    "bone_L-eye.mesh": None, "bone_R-eye.mesh": None,
+    "bone_L-eye_back.mesh": None, "bone_R-eye_back.mesh": None,
+    "bone_L-lid.mesh": None, "bone_R-lid.mesh": None,
+    "bone_L-eyelid-low.mesh": None, "bone_R-eyelid-low.mesh": None,
+    "bone_head_lookat.mesh": ('Cube', (0.4, 0.1, 0.1)),
+    "bone_eyes.mesh": ('Icosphere', (0.3, 0.3, 0.3)),
+    "bone_guitar.mesh": ('Cube', (0.5, 0.5, 0.5)),
+    "bone_jaw.mesh": ('Cube', (0.25, 0.1, 0.1)),
 # microphone bones
-
-        elif (filename == "bone_mic.mesh"):
-            bpy.data.objects['Armature'].pose.bones[filename].custom_shape = bpy.data.objects['Cube']
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[0] = 0.25
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[1] = 0.5
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[2] = 0.5
-        elif (filename == "bone_mic_stand_top.mesh"):
-            bpy.data.objects['Armature'].pose.bones[filename].custom_shape = bpy.data.objects['Cube']
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[0] = 0.5
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[1] = 0.25
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[2] = 0.5
-        elif (filename == "bone_mic_stand_bottom.mesh"):
-            bpy.data.objects['Armature'].pose.bones[filename].custom_shape = bpy.data.objects['Cube']
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[0] = 1.0
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[1] = 1.0
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[2] = 0.25
-
+    "bone_mic.mesh": ('Cube', (0.25, 0.5, 0.5)),
+    "bone_mic_stand_top.mesh": ('Cube', (0.5, 0.25, 0.5)),
+    "bone_mic_stand_bottom.mesh": ('Cube', (1.0, 1.0, 0.25)),
 # the three head bones
-        elif (filename == "bone_head.mesh"):
-            bpy.data.objects['Armature'].pose.bones[filename].custom_shape = bpy.data.objects['Cube']
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[0] = 0.05
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[1] = 0.2
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[2] = 0.2
-        elif (filename == "bone_head_nod.mesh"):
-            bpy.data.objects['Armature'].pose.bones[filename].custom_shape = bpy.data.objects['Cube']
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[0] = 0.2
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[1] = 0.05
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[2] = 0.2
-        elif (filename == "bone_headscale.mesh"):
-            bpy.data.objects['Armature'].pose.bones[filename].custom_shape = bpy.data.objects['Cube']
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[0] = 0.2
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[1] = 0.2
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[2] = 0.05
-
+    "bone_head.mesh": ('Cube', (0.05, 0.2, 0.2)),
+    "bone_head_nod.mesh": ('Cube', (0.2, 0.05, 0.2)),
+    "bone_headscale.mesh": ('Cube', (0.2, 0.2, 0.05)),
 # the two neck bones
-        elif (filename == "bone_neck.mesh"):
-            bpy.data.objects['Armature'].pose.bones[filename].custom_shape = bpy.data.objects['Cube']
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[0] = 0.5
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[1] = 0.5
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[2] = 0.5
-        elif (filename == "bone_neckTwist.mesh"):
-            bpy.data.objects['Armature'].pose.bones[filename].custom_shape = bpy.data.objects['Cube']
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[0] = 0.8
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[1] = 0.25
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[2] = 0.25
-
+    "bone_neck.mesh": ('Cube', (0.5, 0.5, 0.5)),
+    "bone_neckTwist.mesh": ('Cube', (0.8, 0.25, 0.25)),
 # reference point bones
 # these bone shouldn't have any weights *ASSUMING* use by the mic lean system to figure out where the mouth is
-        elif (filename == "bone_nose.mesh" or filename == "bone_forehead.mesh" or filename == "bone_chin.mesh"):
-            bpy.data.objects['Armature'].pose.bones[filename].custom_shape = bpy.data.objects['Empty']
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[0] = 1.0
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[1] = 1.0
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[2] = 1.0
-
+    "bone_nose.mesh": ('Empty', (1.0, 1.0, 1.0)),
+    "bone_forehead.mesh": ('Empty', (1.0, 1.0, 1.0)),
+    "bone_chin.mesh": ('Empty', (1.0, 1.0, 1.0)),
 # arm twist bones
-        elif (filename == "bone_L-upperTwist1.mesh" or filename == "bone_R-upperTwist1.mesh"):
-            bpy.data.objects['Armature'].pose.bones[filename].custom_shape = bpy.data.objects['Empty']
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[0] = 1.0
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[1] = 1.0
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[2] = 1.0
-        elif (filename == "bone_L-upperTwist2.mesh" or filename == "bone_R-upperTwist2.mesh"):
-            bpy.data.objects['Armature'].pose.bones[filename].custom_shape = bpy.data.objects['Empty']
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[0] = 1.0
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[1] = 1.0
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[2] = 1.0
-
-        elif (filename == "bone_L-foreTwist1.mesh" or filename == "bone_R-foreTwist1.mesh"):
-            bpy.data.objects['Armature'].pose.bones[filename].custom_shape = bpy.data.objects['Empty']
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[0] = 1.0
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[1] = 1.0
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[2] = 1.0
-        elif (filename == "bone_L-foreTwist2.mesh" or filename == "bone_R-foreTwist2.mesh"):
-            bpy.data.objects['Armature'].pose.bones[filename].custom_shape = bpy.data.objects['Empty']
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[0] = 1.0
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[1] = 1.0
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[2] = 1.0
-
-
-
-        else:
-            bpy.data.objects['Armature'].pose.bones[filename].custom_shape = bpy.data.objects['Icosphere']
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[0] = 0.25
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[1] = 0.25
-            bpy.data.objects["Armature"].pose.bones[filename].custom_shape_scale_xyz[2] = 0.25
-
-    bpy.ops.object.mode_set(mode='OBJECT')
+    "bone_L-upperTwist1.mesh": ('Empty', (1.0, 1.0, 1.0)), "bone_R-upperTwist1.mesh": ('Empty', (1.0, 1.0, 1.0)),
+    "bone_L-upperTwist2.mesh": ('Empty', (1.0, 1.0, 1.0)), "bone_R-upperTwist2.mesh": ('Empty', (1.0, 1.0, 1.0)),
+    "bone_L-foreTwist1.mesh": ('Empty', (1.0, 1.0, 1.0)), "bone_R-foreTwist1.mesh": ('Empty', (1.0, 1.0, 1.0)),
+    "bone_L-foreTwist2.mesh": ('Empty', (1.0, 1.0, 1.0)), "bone_R-foreTwist2.mesh": ('Empty', (1.0, 1.0, 1.0)),
+}
 
-def MeshTrans(basename, self, filename, file):        
+def bone_shape(filename):
+    if filename in BONE_SHAPES:
+        return BONE_SHAPES[filename]
+    if "spot" in filename:
+        return ('Cube', (0.1, 0.25, 0.1))
+    return ('Icosphere', (0.25, 0.25, 0.25))
+
+def rot_matrix(Upper):
+    return mathutils.Matrix((
+        (Upper[0], Upper[3], Upper[6], 0.0),
+        (Upper[1], Upper[4], Upper[7], 0.0),
+        (Upper[2], Upper[5], Upper[8], 0.0),
+        (0.0, 0.0, 0.0, 1.0),
+    ))
+
+class ArmatureBuilder:
+    # One per import. Trans and bone mesh entries are only collected while the milo is walked,
+    # build() then makes every bone in one EDIT session and poses them all in one POSE pass
+    # instead of switching modes three times per bone
+    def __init__(self):
+        # (TransData, pose from the world transform, gets a custom shape)
+        self.bones = []
+
+    def add(self, data, world=False):
+        self.bones.append((data, world, not world))
+
+    def build(self):
+        if not self.bones:
+            return
+        armature_data = bpy.data.armatures.get(ARMATURE_NAME)
+        if armature_data is None:
+            armature_data = bpy.data.armatures.new(ARMATURE_NAME)
+        armature_obj = bpy.data.objects.get(ARMATURE_NAME)
+        if armature_obj is None:
+            armature_obj = bpy.data.objects.new(ARMATURE_NAME, armature_data)
+            bpy.context.scene.collection.objects.link(armature_obj)
+            if any(shaped for data, world, shaped in self.bones):
+                bpy.ops.mesh.primitive_ico_sphere_add()
+                bpy.ops.mesh.primitive_cube_add()
+                bpy.ops.object.empty_add(type='PLAIN_AXES')
+        bpy.context.view_layer.objects.active = armature_obj
+        bpy.ops.object.mode_set(mode='EDIT')
+        edit_bones = armature_obj.data.edit_bones
+        by_name = {bone.name: bone for bone in edit_bones}
+        for data, world, shaped in self.bones:
+            for name in (data.name, data.parent):
+                if name not in by_name:
+                    bone = edit_bones.new(name)
+                    bone.head = (0, 0, 0)
+                    bone.tail = (0, 1, 0)
+                    bone.use_deform = True
+                    by_name[name] = bone
+            by_name[data.name].parent = by_name[data.parent]
+        # edit bone names are all that survives the mode switch
+        names = {name: bone.name for name, bone in by_name.items()}
+        bpy.ops.object.mode_set(mode='POSE')
+        pose_bones = armature_obj.pose.bones
+        for data, world, shaped in self.bones:
+            pose_bone = pose_bones.get(names[data.name])
+            if pose_bone is None:
+                continue
+            if world:
+                pose_bone.matrix_basis = rot_matrix(data.world_rot)
+                pose_bone.location = data.world_pos
+            else:
+                pose_bone.matrix_basis = rot_matrix(data.local_rot)
+                pose_bone.location = data.local_pos
+            if shaped:
+                shape = bone_shape(data.name)
+                if shape is not None:
+                    pose_bone.custom_shape = bpy.data.objects[shape[0]]
+                    pose_bone.custom_shape_scale_xyz = shape[1]
+        bpy.ops.object.mode_set(mode='OBJECT')
+
+def read_mesh_trans(filename, file):
     f = io.BytesIO(file)
     f.seek(21)
     LocalUpper = struct.unpack('>9f', f.read(36))
@@ -1442,48 +1640,17 @@ def MeshTrans(basename, self, filename, file):
     Target = b_numstring(f)
     f.seek(1, 1)
     ParentName = b_numstring(f)
-    if "Armature" in bpy.data.armatures:
-        armature_data = bpy.data.armatures["Armature"]
-    else:
-        armature_data = bpy.data.armatures.new("Armature")
-    if "Armature" in bpy.data.objects:
-        armature_obj = bpy.data.objects["Armature"]
-    else:
-        armature_obj = bpy.data.objects.new("Armature", armature_data)
-        bpy.context.scene.collection.objects.link(armature_obj)
-    bpy.context.view_layer.objects.active = armature_obj
-    bpy.ops.object.mode_set(mode='EDIT')
-    edit_bone = armature_obj.data.edit_bones.get(filename)
-    if edit_bone is None:
-        edit_bone = armature_obj.data.edit_bones.new(filename)
-        edit_bone.head = (0, 0, 0)
-        edit_bone.tail = (0, 1, 0)
-        edit_bone.use_deform = True
-    parent_bone = armature_obj.data.edit_bones.get(ParentName)
-    if parent_bone is None:
-        parent_bone = armature_obj.data.edit_bones.new(ParentName)
-        parent_bone.head = (0, 0, 0)
-        parent_bone.tail = (0, 1, 0)
-        parent_bone.use_deform = True
-    if parent_bone:
-        edit_bone.parent = parent_bone
-    bpy.ops.object.mode_set(mode='POSE')
-    pose_bone = armature_obj.pose.bones.get(filename)
-    if pose_bone:
-        pose_bone.matrix_basis = mathutils.Matrix((
-            (WorldUpper[0], WorldUpper[3], WorldUpper[6], 0.0),
-            (WorldUpper[1], WorldUpper[4], WorldUpper[7], 0.0),
-            (WorldUpper[2], WorldUpper[5], WorldUpper[8], 0.0),
-            (0.0, 0.0, 0.0, 1.0),
-        ))
-        pose_bone.location = WorldPos  
-    bpy.ops.object.mode_set(mode='OBJECT')
-    
-def TransAnim(self, filename, basename, file):
-    print(filename)
+    return TransData(filename, ParentName, LocalUpper, LocalPos, WorldUpper, WorldPos)
+
+def read_keys(f, endian, width):
+    # key count, then width floats per key with the frame last
+    KeyCount = struct.unpack(endian + 'I', f.read(4))[0]
+    return np.frombuffer(f.read(KeyCount * width * 4), dtype=endian + 'f4').reshape(KeyCount, width).astype(np.float32)
+
+def read_trans_anim(self, filename, file, basename):
     f = io.BytesIO(file)
-    bpy.context.scene.render.fps = 30
     if self.little_endian_setting:
+        endian = '<'
         Version = l_int(f)
         if Version == 4:
             f.seek(8)
@@ -1495,143 +1662,109 @@ def TransAnim(self, filename, basename, file):
             AnimCount = l_int(f)
             for x in range(AnimCount):
                 AnimObject = l_numstring(f)
-            f.seek(25, 1)            
-            TransObject = l_numstring(f)
-            obj = bpy.data.objects.get(TransObject)
-            if obj is None:
-                return
-            RotKeysCount = l_int(f)
-            for x in range(RotKeysCount):
-                Quat = struct.unpack('ffff', f.read(16))
-                Pos = l_float(f)
-                obj.rotation_mode = 'QUATERNION'
-                obj.rotation_quaternion = (Quat[3], Quat[0], Quat[1], Quat[2])
-                obj.keyframe_insert("rotation_quaternion", frame=Pos)
-            TransKeysCount = l_int(f)
-            for x in range(TransKeysCount):
-                Location = struct.unpack('fff', f.read(12))
-                Pos = l_float(f)
-                obj.location = Location
-                obj.keyframe_insert("location", frame=Pos)
-            TransAnimOwner = l_numstring(f)
-            f.seek(2, 1)
-            ScaleKeysCount = l_int(f)
-            for x in range(ScaleKeysCount):
-                Scale = struct.unpack('fff', f.read(12))
-                Pos = l_float(f)
-                obj.scale = Scale
-                obj.keyframe_insert("scale", frame=Pos)
+            f.seek(25, 1)
         elif Version == 6 and basename.endswith('.milo_xbox'):
             f.seek(29)
-            TransObject = l_numstring(f)
-            obj = bpy.data.objects.get(TransObject)
-            if obj is None:
-                return
-            RotKeysCount = l_int(f)
-            for x in range(RotKeysCount):
-                Quat = struct.unpack('ffff', f.read(16))
-                Pos = l_float(f)
-                obj.rotation_mode = 'QUATERNION'
-                obj.rotation_quaternion = (Quat[3], Quat[0], Quat[1], Quat[2])
-                obj.keyframe_insert("rotation_quaternion", frame=Pos)
-            TransKeysCount = l_int(f)
-            for x in range(TransKeysCount):
-                Location = struct.unpack('fff', f.read(12))
-                Pos = l_float(f)
-                obj.location = Location
-                obj.keyframe_insert("location", frame=Pos)
-            TransAnimOwner = l_numstring(f)
-            f.seek(2, 1)
-            ScaleKeysCount = l_int(f)
-            for x in range(ScaleKeysCount):
-                Scale = struct.unpack('fff', f.read(12))
-                Pos = l_float(f)
-                obj.scale = Scale
-                obj.keyframe_insert("scale", frame=Pos)
         elif Version == 6 and basename.endswith('.milo_ps2'):
             f.seek(25)
-            TransObject = l_numstring(f)
-            obj = bpy.data.objects.get(TransObject)
-            if obj is None:
-                return
-            RotKeysCount = l_int(f)
-            for x in range(RotKeysCount):
-                Quat = struct.unpack('ffff', f.read(16))
-                Pos = l_float(f)
-                obj.rotation_mode = 'QUATERNION'
-                obj.rotation_quaternion = (Quat[3], Quat[0], Quat[1], Quat[2])
-                obj.keyframe_insert("rotation_quaternion", frame=Pos)
-            TransKeysCount = l_int(f)
-            for x in range(TransKeysCount):
-                Location = struct.unpack('fff', f.read(12))
-                Pos = l_float(f)
-                obj.location = Location
-                obj.keyframe_insert("location", frame=Pos)
-            TransAnimOwner = l_numstring(f)
-            f.seek(2, 1)
-            ScaleKeysCount = l_int(f)
-            for x in range(ScaleKeysCount):
-                Scale = struct.unpack('fff', f.read(12))
-                Pos = l_float(f)
-                obj.scale = Scale
-                obj.keyframe_insert("scale", frame=Pos)
+        else:
+            return None
+        TransObject = l_numstring(f)
     else:
+        endian = '>'
         f.seek(29)
         TransObject = b_numstring(f)
-        obj = bpy.data.objects.get(TransObject)
-        if obj is None:
-            return
-        RotKeysCount = b_int(f)
-        for x in range(RotKeysCount):
-            Quat = struct.unpack('>ffff', f.read(16))
-            Pos = b_float(f)
-            obj.rotation_mode = 'QUATERNION'
-            obj.rotation_quaternion = (Quat[3], Quat[0], Quat[1], Quat[2])
-            obj.keyframe_insert("rotation_quaternion", frame=Pos)
-        TransKeysCount = b_int(f)
-        for x in range(TransKeysCount):
-            Location = struct.unpack('>fff', f.read(12))
-            Pos = b_float(f)
-            obj.location = Location
-            obj.keyframe_insert("location", frame=Pos)
-        TransAnimOwner = b_numstring(f)
-        f.seek(2, 1)
-        ScaleKeysCount = b_int(f)
-        for x in range(ScaleKeysCount):
-            Scale = struct.unpack('>fff', f.read(12))
-            Pos = b_float(f)
-            obj.scale = Scale
-            obj.keyframe_insert("scale", frame=Pos)
-        
-def PropAnim(self, file):
+    # x, y, z, w, frame
+    RotKeys = read_keys(f, endian, 5)
+    # x, y, z, frame
+    TransKeys = read_keys(f, endian, 4)
+    TransAnimOwner = l_numstring(f) if endian == '<' else b_numstring(f)
+    f.seek(2, 1)
+    ScaleKeys = read_keys(f, endian, 4)
+    return TransAnimData(TransObject, RotKeys, TransKeys, ScaleKeys)
+
+def build_trans_anim(data):
+    bpy.context.scene.render.fps = 30
+    obj = bpy.data.objects.get(data.target)
+    if obj is None:
+        return
+    if len(data.rot_keys) > 0:
+        obj.rotation_mode = 'QUATERNION'
+        key_fcurves(obj, "rotation_quaternion", data.rot_keys[:, 4], data.rot_keys[:, [3, 0, 1, 2]])
+    key_fcurves(obj, "location", data.trans_keys[:, 3], data.trans_keys[:, :3])
+    key_fcurves(obj, "scale", data.scale_keys[:, 3], data.scale_keys[:, :3])
+
+# PropKeys types that fit on an F-curve and how many floats a key holds before its frame
+# kFloat, kColor, kQuat, kVector3
+PROP_KEY_FLOATS = {0: 1, 1: 4, 4: 4, 5: 3}
+PROP_KEY_BOOL = 3
+# kObject and kSymbol keys are a string and a frame
+PROP_KEY_STRINGS = (2, 6)
+
+def read_prop_anim(file):
     f = io.BytesIO(file)
     Version = b_int(f)
-    if Version == 11:
-        f.seek(29)
-        PropKeysCount = b_int(f)
-        f.seek(8, 1)
-        Target = b_numstring(f)
-        obj = bpy.data.objects.get(Target)
-        if obj is None:
-            return
-        f.seek(1, 1)
-        ChildCount = struct.unpack('>H', f.read(2))[0]
-        ID = b_int(f)
-        for x in range(ChildCount):
+    if Version != 11:
+        return []
+    f.seek(29)
+    PropKeysCount = b_int(f)
+    Tracks = []
+    try:
+        for x in range(PropKeysCount):
+            KeysType = b_int(f)
             f.seek(4, 1)
-            # Value defines if this is position, rotation, scale, etc.
-            Value = b_numstring(f)
-        f.seek(12, 1)
-        EventCount = b_int(f)
-        for x in range(EventCount):
-            if Value == "position":
-                Position = struct.unpack('>fff', f.read(12))
-                Pos = b_float(f)
-                obj.location = Position
-                obj.keyframe_insert("location", frame=Pos)
-        
-                    
-def CharClipSamples(self, file):
+            Target = b_numstring(f)
+            f.seek(1, 1)
+            ChildCount = struct.unpack('>H', f.read(2))[0]
+            ID = b_int(f)
+            Value = None
+            for y in range(ChildCount):
+                f.seek(4, 1)
+                # Value defines if this is position, rotation, scale, etc.
+                Value = b_numstring(f)
+            f.seek(12, 1)
+            if KeysType in PROP_KEY_FLOATS:
+                Keys = read_keys(f, '>', PROP_KEY_FLOATS[KeysType] + 1)
+            elif KeysType == PROP_KEY_BOOL:
+                KeyCount = b_int(f)
+                raw = np.frombuffer(f.read(5 * KeyCount), dtype=[('value', 'u1'), ('frame', '>f4')])
+                Keys = np.stack((raw['value'], raw['frame']), axis=1).astype(np.float32)
+            elif KeysType in PROP_KEY_STRINGS:
+                for y in range(b_int(f)):
+                    b_numstring(f)
+                    f.seek(4, 1)
+                continue
+            else:
+                # unknown key layout, nothing after it can be found
+                break
+            if Value is not None:
+                Tracks.append(PropAnimData(Target, Value, Keys))
+    except (struct.error, ValueError, UnicodeDecodeError):
+        # cut short or misread block, keep the tracks read before it
+        pass
+    return Tracks
+
+def build_prop_anim(data):
+    obj = bpy.data.objects.get(data.target)
+    if obj is None or len(data.keys) == 0:
+        return
+    Frames = data.keys[:, -1]
+    Values = data.keys[:, :-1]
+    if data.prop == "position" and Values.shape[1] == 3:
+        DataPath = "location"
+    elif data.prop == "scale" and Values.shape[1] == 3:
+        DataPath = "scale"
+    elif data.prop == "rotation" and Values.shape[1] == 4:
+        obj.rotation_mode = 'QUATERNION'
+        DataPath = "rotation_quaternion"
+        Values = Values[:, [3, 0, 1, 2]]
+    else:
+        # no Blender equivalent, animate a custom property of the same name instead
+        obj[data.prop] = Values[0].tolist() if Values.shape[1] > 1 else float(Values[0, 0])
+        DataPath = '["%s"]' % data.prop
+    key_fcurves(obj, DataPath, Frames, Values)
+
+def read_char_clip(file):
     f = io.BytesIO(file)
     Version = b_int(f)
     f.seek(12)
@@ -1659,60 +1792,807 @@ def CharClipSamples(self, file):
     f.seek(4, 1)
     NumSamples = b_int(f)
     NumFrames = b_int(f)
-    Frames = []
-    for x in range(NumFrames):
-        Frame = b_float(f)
-        Frames.append(Frame)
-    print(NumSamples)
-    Armature = bpy.data.objects.get('Armature')
-    for i in range(NumSamples):
-        frame_index = int(i / NumSamples * NumFrames)
-        bpy.context.scene.frame_set(int(Frames[frame_index]))
-        for Name in BoneNames:
-            if "pos" in Name:
-                x, y, z = struct.unpack('>hhh', f.read(6))
-                x_float = x / 32767 * 1345
-                y_float = y / 32767 * 1345
-                z_float = z / 32767 * 1345
-                Name = Name.replace('.pos', '.mesh')
-                Bone = Armature.pose.bones.get(Name)
-                if Bone:
-                    Bone.location = (x_float, -z_float, y_float)
-                    Bone.keyframe_insert("location")
-            elif "quat" in Name:
-                x, y, z, w = struct.unpack('>hhhh', f.read(8))
-                x_float = x / 32767
-                y_float = y / 32767
-                z_float = z / 32767
-                w_float = w / 32767
-                Name = Name.replace('.quat', '.mesh')
-                Bone = Armature.pose.bones.get(Name)
-                if Bone:
-                    Bone.rotation_mode = 'QUATERNION'
-                    Bone.rotation_quaternion = (w_float, x_float, -z_float, y_float)
-                    print("frame", frame_index, "bone", Bone, "ROTATION", Bone.rotation_quaternion, "LOCATION", Bone.location)
-                    Bone.keyframe_insert("rotation_quaternion")
-            elif "rotz" in Name:
-                rotz = f.read(2)
+    Frames = np.frombuffer(f.read(4 * NumFrames), dtype='>f4')
+    # every sample holds one value per channel: pos is 3 shorts, quat 4 shorts, rotz 1 short
+    channels = []
+    SampleSize = 0
+    for Name in BoneNames:
+        if "pos" in Name:
+            channels.append((Name.replace('.pos', '.mesh'), "location", SampleSize, '>3i2'))
+            SampleSize += 6
+        elif "quat" in Name:
+            channels.append((Name.replace('.quat', '.mesh'), "rotation_quaternion", SampleSize, '>4i2'))
+            SampleSize += 8
+        elif "rotz" in Name:
+            SampleSize += 2
+    if NumSamples == 0 or SampleSize == 0:
+        return CharClipData(np.empty(0, np.int64), [])
+    sample = np.dtype({
+        'names': ['c%d' % i for i in range(len(channels))],
+        'formats': [fmt for Name, DataPath, offset, fmt in channels],
+        'offsets': [offset for Name, DataPath, offset, fmt in channels],
+        'itemsize': SampleSize,
+    })
+    samples = np.frombuffer(f.read(SampleSize * NumSamples), dtype=sample, count=NumSamples)
+    SampleFrames = Frames[(np.arange(NumSamples) / NumSamples * NumFrames).astype(np.int64)].astype(np.int64)
+    Channels = []
+    for i, (Name, DataPath, offset, fmt) in enumerate(channels):
+        raw = samples['c%d' % i].astype(np.float64) / 32767
+        if DataPath == "location":
+            x, y, z = (raw * 1345).T
+            Values = np.stack((x, -z, y), axis=1)
+        else:
+            x, y, z, w = raw.T
+            Values = np.stack((w, x, -z, y), axis=1)
+        Channels.append((Name, DataPath, Values.astype(np.float32)))
+    return CharClipData(SampleFrames, Channels)
+
+def build_char_clip(data):
+    # Written straight into the action, the current frame never changes
+    Armature = bpy.data.objects.get(ARMATURE_NAME)
+    if Armature is None:
+        return
+    for Name, DataPath, Values in data.channels:
+        Bone = Armature.pose.bones.get(Name)
+        if Bone:
+            if DataPath == "rotation_quaternion":
+                Bone.rotation_mode = 'QUATERNION'
+            key_fcurves(Armature, Bone.path_from_id(DataPath), data.sample_frames, Values, group=Bone.name)
     Armature.location = (-3, 140, 0)
     Armature.rotation_euler = ((math.radians(-90)), 0, 0)
 
+# Bump when a read_* function changes what it returns, old cache files stop matching then
+PARSER_VERSION = "2"
+PARSE_CACHE_SIZE = 1024 * 1024 * 1024
+
+def default_cache_dir():
+    base = os.environ.get('LOCALAPPDATA') or os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'hmx-importer')
+
+CACHED_TYPES = {cls.__name__: cls for cls in (MeshData, TransData, TransAnimData, PropAnimData, CharClipData, GroupData, TexData)}
+
+def cache_encode(value, arrays):
+    # arrays go in the .npz as they are, everything around them becomes json
+    if isinstance(value, np.ndarray):
+        key = 'a%d' % len(arrays)
+        arrays[key] = value
+        return {'array': key}
+    if type(value).__name__ in CACHED_TYPES:
+        return {'type': type(value).__name__,
+                'fields': [cache_encode(getattr(value, field.name), arrays) for field in dataclasses.fields(value)]}
+    if isinstance(value, list):
+        return {'list': [cache_encode(x, arrays) for x in value]}
+    if isinstance(value, tuple):
+        return {'tuple': [cache_encode(x, arrays) for x in value]}
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, bytes):
+        key = 'a%d' % len(arrays)
+        arrays[key] = np.frombuffer(value, dtype=np.uint8)
+        return {'bytes': key}
+    return value
+
+def cache_decode(value, arrays):
+    if not isinstance(value, dict):
+        return value
+    if 'array' in value:
+        return arrays[value['array']]
+    if 'bytes' in value:
+        return arrays[value['bytes']].tobytes()
+    if 'type' in value:
+        return CACHED_TYPES[value['type']](*(cache_decode(x, arrays) for x in value['fields']))
+    if 'list' in value:
+        return [cache_decode(x, arrays) for x in value['list']]
+    return tuple(cache_decode(x, arrays) for x in value['tuple'])
+
+class ParseCache:
+    # One .npz per parsed entry, named by the hash of the entry bytes and everything else the
+    # result depends on. Hits get their mtime bumped, trim() drops the oldest past the size limit
+    def __init__(self, settings, basename):
+        self.folder = settings.cache_dir
+        self.salt = (PARSER_VERSION, os.path.splitext(basename)[1], str(settings.little_endian_setting),
+                     str(settings.low_lod_setting), str(settings.shadow_setting))
+        if self.folder:
+            os.makedirs(self.folder, exist_ok=True)
+
+    def read(self, kind, name, file, parse):
+        with PROFILE.stage("parse " + kind, bytes=len(file)) as stage:
+            data = self.load(kind, name, file, parse, stage)
+            stage.add(**element_counts(data))
+        return data
+
+    def load(self, kind, name, file, parse, stage):
+        if not self.folder:
+            return parse()
+        path = os.path.join(self.folder, entry_hash(file, kind, name, *self.salt) + ".npz")
+        try:
+            with np.load(path, allow_pickle=False) as z:
+                arrays = {key: z[key] for key in z.files}
+            os.utime(path)
+            data = cache_decode(json.loads(str(arrays.pop('meta'))), arrays)
+            stage.add(cached=1)
+            return data
+        except (OSError, ValueError, KeyError):
+            pass
+        data = parse()
+        arrays = {}
+        arrays['meta'] = np.array(json.dumps(cache_encode(data, arrays)))
+        try:
+            tmp = "%s.%d.tmp" % (path, os.getpid())
+            with open(tmp, 'wb') as out:
+                np.savez(out, **arrays)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(e)
+        return data
+
+    def trim(self):
+        if not self.folder:
+            return
+        cached = []
+        for entry in os.scandir(self.folder):
+            if entry.name.endswith(".npz"):
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                cached.append((st.st_mtime_ns, st.st_size, entry.path))
+        total = sum(size for mtime, size, path in cached)
+        for mtime, size, path in sorted(cached):
+            if total <= PARSE_CACHE_SIZE:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+INDEX_VERSION = 3
+INDEX_SUFFIX = ".hmxidx"
+
+class MiloIndex:
+    # Sidecar next to a milo (or in the cache folder when that's read only) with the directory
+    # table, where every entry sits in the decompressed milo and which compressed blocks hold it
+    # and, once parsed, vert/face counts of the meshes. Checked against the size and mtime of the
+    # milo, so picked entries can be read without inflating the rest. Entries only get hashed when
+    # they're parsed, by the parse cache
+    def __init__(self, data):
+        self.data = data
+        self.changed = False
+
+    @staticmethod
+    def paths(settings):
+        paths = [settings.filepath + INDEX_SUFFIX]
+        if settings.cache_dir:
+            name = entry_hash(os.path.abspath(settings.filepath).encode('utf-8')) + INDEX_SUFFIX
+            paths.append(os.path.join(settings.cache_dir, name))
+        return paths
+
+    @staticmethod
+    def stamp(settings):
+        st = os.stat(settings.filepath)
+        return [INDEX_VERSION, st.st_size, st.st_mtime_ns, settings.little_endian_setting, settings.venue_setting]
+
+    @classmethod
+    def load(cls, settings):
+        # None when there is no index or the milo changed since
+        stamp = cls.stamp(settings)
+        for path in cls.paths(settings):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if data.get("stamp") == stamp:
+                return cls(data)
+        return None
+
+    @classmethod
+    def build(cls, settings, f, buf, groups):
+        # f is the milo as stored, buf the decompressed map read_milo_dirs went through
+        f.seek(0)
+        Magic, StartOffset, BlockCount = struct.unpack('<3I', f.read(12))
+        blocks = []
+        if Magic in (MILO_ZLIB, MILO_GZIP, MILO_ZLIB_SIZED):
+            f.seek(16)
+            sizes = struct.unpack('<%dI' % BlockCount, f.read(4 * BlockCount))
+            inflated = struct.unpack_from('<%dI' % BlockCount, buf, 16)
+            pos = out = StartOffset
+            for size, out_size in zip(sizes, inflated):
+                packed = Magic != MILO_ZLIB_SIZED or size & 0xFF000000 == 0
+                if Magic == MILO_ZLIB_SIZED:
+                    size &= 0x00FFFFFF
+                blocks.append([pos, size, packed, out, out_size])
+                pos += size
+                out += out_size
+        index_groups = []
+        for dirs, filenames, files, bone_meshes, path in groups:
+            entries = [[directory, name, start, end] for directory, name, (start, end) in zip(dirs, filenames, files.spans)]
+            index_groups.append({"path": path, "bone_meshes": bone_meshes, "entries": entries})
+        index = cls({"stamp": cls.stamp(settings), "magic": Magic, "blocks": blocks,
+                     "groups": index_groups, "counts": {}})
+        index.changed = True
+        return index
+
+    def save(self, settings):
+        if not self.changed:
+            return
+        for path in self.paths(settings):
+            try:
+                tmp = "%s.%d.tmp" % (path, os.getpid())
+                with open(tmp, 'w', encoding='utf-8') as out:
+                    json.dump(self.data, out)
+                os.replace(tmp, path)
+                self.changed = False
+                return
+            except OSError as e:
+                debug(e)
+
+    def entries(self):
+        # (directory, name, start, end, bone_meshes, path) in directory order
+        for group in self.data["groups"]:
+            for directory, name, start, end in group["entries"]:
+                yield directory, name, start, end, group["bone_meshes"], group["path"]
+
+    def groups(self, f, wanted):
+        # Same as read_milo_dirs, but only with the entries wanted(directory, name) picks,
+        # and only the blocks those entries sit in get inflated
+        view = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        blocks = self.data["blocks"]
+        picked = [[(directory, name, start, end) for directory, name, start, end in group["entries"]
+                   if wanted(directory, name)] for group in self.data["groups"]]
+        needed = sorted({x for group in picked for directory, name, start, end in group
+                         for x, (pos, size, packed, out, out_size) in enumerate(blocks)
+                         if out < end and start < out + out_size})
+        Magic = self.data["magic"]
+        def inflate(x):
+            pos, size, packed, out, out_size = blocks[x]
+            return inflate_block(Magic, view[pos:pos + size]) if packed else view[pos:pos + size]
+        with ThreadPoolExecutor() as pool:
+            inflated = dict(zip(needed, pool.map(inflate, needed)))
+        def read(start, end):
+            if not blocks:
+                return view[start:end]
+            pieces = []
+            for x, (pos, size, packed, out, out_size) in enumerate(blocks):
+                if out < end and start < out + out_size:
+                    pieces.append(memoryview(inflated[x])[max(start, out) - out:min(end, out + out_size) - out])
+            if len(pieces) == 1:
+                return pieces[0]
+            return memoryview(b''.join(pieces))
+        groups = []
+        for group, entries in zip(self.data["groups"], picked):
+            groups.append(([directory for directory, name, start, end in entries],
+                           [name for directory, name, start, end in entries],
+                           [read(start, end) for directory, name, start, end in entries],
+                           group["bone_meshes"], group["path"]))
+        return groups
+
+    def add_counts(self, entries):
+        counts = self.data["counts"]
+        for kind, data in entries:
+            if kind == 'mesh' and data is not None and data.name not in counts:
+                counts[data.name] = [len(data.verts), len(data.faces)]
+                self.changed = True
+
+def index_milo(self, f):
+    # The index of an open milo, made from its directory table when there is none yet
+    index = MiloIndex.load(self)
+    if index is None:
+        buf = open_milo(f)
+        index = MiloIndex.build(self, f, buf, read_milo_dirs(self, buf))
+        index.save(self)
+    return index
+
+# files that animate or light what milos build, imported after every milo picked with them
+AFTER_MILOS = ('.ccs', '.cam', '.lit')
+
+MILO_EXTENSIONS = ('.milo_ps3', '.milo_xbox', '.milo_wii', '.milo_ps2', '.rnd', '.rnd_ps2')
+
+def entry_kinds(directory, name, bone_meshes=False):
+    # What read_entries makes of one directory entry, from its type and name alone.
+    # bone_meshes is for the old BE milos, which keep their bones as meshes
+    kinds = []
+    if ".mat" in name and "Mat" in directory:
+        kinds.append('mat')
+    if "Tex" in directory:
+        kinds.append('tex')
+    if ".mesh" in name and "Mesh" in directory:
+        kinds.append('mesh')
+    if ".mesh" in name and "Trans" in directory:
+        kinds.append('trans')
+    if ".grp" in name and "Group" in directory:
+        kinds.append('group')
+    if bone_meshes:
+        if "bone" in name and "Mesh" in directory:
+            kinds.append('bone')
+        elif "PropAnim" in directory:
+            kinds.append('prop_anim')
+    elif "TransAnim" in directory:
+        kinds.append('trans_anim')
+    elif "PropAnim" in directory:
+        kinds.append('prop_anim')
+    return kinds
+
+def read_entries(self, basename, dirs, filenames, files, bone_meshes=False, cache=None, names=None, skip=()):
+    # (kind, data) for every entry the build side knows about, in directory order.
+    # names limits it to the entries with those names, the ones in skip are left out
+    if cache is None:
+        cache = ParseCache(ImportSettings(), basename)
+    entries = []
+    for directory, name, file in zip(dirs, filenames, files):
+        if bone_meshes:
+            debug(directory, name, bytes(file[:4]))
+        if names is not None and name not in names or name in skip:
+            continue
+        for kind in entry_kinds(directory, name, bone_meshes):
+            if kind == 'mat':
+                try:
+                    with PROFILE.stage("parse mat", bytes=len(file)):
+                        entries.append(('mat', (name, read_mat(self, name, file), entry_hash(file, str(self.little_endian_setting)))))
+                except Exception as e:
+                    print(e)
+                continue
+            if kind == 'tex':
+                if self.pack_textures:
+                    digest, tex = cache.read('tex', name, file, lambda: packed_tex(basename, self, name, file))
+                    entries.append(('tex', (name, digest, tex)))
+                else:
+                    entries.append(('tex', (name, Tex(basename, self, name, file))))
+                continue
+            if kind == 'mesh':
+                parse = lambda: read_mesh(self, name, file, basename)
+            elif kind == 'trans':
+                parse = lambda: read_trans(self, name, file, basename)
+            elif kind == 'bone':
+                parse = lambda: read_mesh_trans(name, file)
+            elif kind == 'trans_anim':
+                debug(name)
+                parse = lambda: read_trans_anim(self, name, file, basename)
+            elif kind == 'group':
+                parse = lambda: read_group(self, name, file)
+            else:
+                parse = lambda: read_prop_anim(file)
+            entries.append((kind, cache.read(kind, name, file, parse)))
+       # if ".lit" in name and "Light" in directory:
+       #     Light(self, file, name)
+       # elif ".cam" in name and "Cam" in directory:
+       #     Cam(self, file)
+    return entries
+
+def entry_uses(kind, data):
+    # Names of the other entries an entry needs to build right
+    if data is None:
+        return ()
+    if kind == 'mesh':
+        return (data.mat_name,)
+    if kind == 'mat' and data[1] is not None:
+        return tuple(getattr(data[1], field) for field, socket in MAT_TEX_INPUTS)
+    return ()
+
+def deferred_lods(self, basename, groups, cache):
+    # Names of the objects only in LOD groups past LOD0, left for when their collection gets turned on
+    deferred = set()
+    kept = set()
+    for dirs, filenames, files, bone_meshes, path in groups:
+        for directory, name, file in zip(dirs, filenames, files):
+            if 'group' in entry_kinds(directory, name, bone_meshes):
+                group = cache.read('group', name, file, lambda: read_group(self, name, file))
+                if group.lod is not None:
+                    (deferred if group.lod > 0 else kept).update(group.objects)
+    return deferred - kept
+
+def read_chosen(self, basename, groups, cache):
+    # The entries picked in the entry browser, then the materials their meshes use,
+    # then the textures of those materials. groups(names) gives the directory groups to look in
+    entries = []
+    seen = set()
+    names = set(self.entry_names)
+    while names:
+        seen |= names
+        found = []
+        for dirs, filenames, files, bone_meshes, path in groups(names):
+            found += read_entries(self, basename, dirs, filenames, files, bone_meshes, cache, names)
+        entries += found
+        names = {name for kind, data in found for name in entry_uses(kind, data) if name} - seen
+    return entries
+
+def read_milo(self):
+    # Everything about one file that doesn't need Blender, so it can run in a worker process
+    basename = os.path.basename(self.filepath)
+    cache = ParseCache(self, basename)
+    with open(self.filepath, 'rb') as f:
+        if self.filepath.endswith('.ccs'):
+            file = f.read()
+            entries = [('char_clip', cache.read('char_clip', basename, file, lambda: read_char_clip(file)))]
+        else:
+            index = MiloIndex.load(self)
+            if index is not None and self.entry_names:
+                # straight to the picked entries
+                def groups(names):
+                    with PROFILE.stage("indexed read") as stage:
+                        picked = index.groups(f, lambda directory, name: name in names)
+                        stage.add(entries=sum(len(files) for dirs, filenames, files, bone_meshes, path in picked))
+                    return picked
+                entries = read_chosen(self, basename, groups, cache)
+            else:
+                with PROFILE.stage("decompress") as stage:
+                    buf = open_milo(f)
+                    stage.add(bytes=len(buf))
+                with PROFILE.stage("directory") as stage:
+                    groups = read_milo_dirs(self, buf)
+                    stage.add(entries=sum(len(files) for dirs, filenames, files, bone_meshes, path in groups))
+                if index is None:
+                    with PROFILE.stage("index"):
+                        index = MiloIndex.build(self, f, buf, groups)
+                if self.entry_names:
+                    entries = read_chosen(self, basename, lambda names: groups, cache)
+                else:
+                    skip = deferred_lods(self, basename, groups, cache) if self.low_lod_setting else set()
+                    entries = []
+                    for dirs, filenames, files, bone_meshes, path in groups:
+                        entries += read_entries(self, basename, dirs, filenames, files, bone_meshes, cache, skip=skip)
+            index.add_counts(entries)
+            index.save(self)
+    cache.trim()
+    return entries
+
+def scan_milo(self):
+    # (name, kinds, size, path) of every entry the importer can build, for the entry browser. Comes
+    # from the index, the first time that means inflating the milo once to find where entries sit.
+    # Nothing gets parsed or hashed
+    with open(self.filepath, 'rb') as f:
+        index = index_milo(self, f)
+    found = []
+    for directory, name, start, end, bone_meshes, path in index.entries():
+        kinds = entry_kinds(directory, name, bone_meshes)
+        if kinds:
+            found.append((name, kinds, end - start, path))
+    return found
+
+def read_milo_traced(self):
+    # read_milo in a worker process, the profile events go back with the entries
+    PROFILE.start(self.profile)
+    return read_milo(self), PROFILE.take()
+
+def open_milo(f):
+    # Map the milo instead of reading it, entries are handed out as slices of the map
+    f = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return decompress_milo(f)
+
+# ObjectDir, RndDir, PanelDir, WorldDir, Character, BandCharacter...
+INLINE_DIR_TYPES = ("Dir", "Character")
+
+class InlineDirWalker:
+    # Venue milos inline their sub directories (geometry, lighting, crowd, per song) into the
+    # data of the directory holding them: the .milo name, the sub directory's header and entry
+    # table, its own data, then its entries, before the rest of the parent's data. This walks
+    # the milo once front to back and recurses into every one it meets, at any depth
+    def __init__(self, buf):
+        self.buf = buf
+        self.heads = []
+        self.next_head = 0
+
+    def string(self, pos):
+        # BE numstring at pos that reads as a name, ValueError otherwise
+        size = struct.unpack_from('>I', self.buf, pos)[0]
+        if size > 0xFF or pos + 4 + size > len(self.buf):
+            raise ValueError(pos)
+        text = bytes(self.buf[pos + 4:pos + 4 + size]).decode('ascii')
+        if not text.isprintable():
+            raise ValueError(pos)
+        return text, pos + 4 + size
+
+    def head(self, end):
+        # (start, sub milo name, types, names, table end) when the .milo name ending at end
+        # starts an inlined directory, None when it's only a name in some entry
+        buf = self.buf
+        for size in range(5, min(0xFF, end - 4) + 1):
+            start = end - size - 4
+            if struct.unpack_from('>I', buf, start)[0] == size:
+                break
+        else:
+            return None
+        try:
+            name = bytes(buf[start + 4:end]).decode('ascii')
+            DirType, pos = self.string(end + 4)
+            DirName, pos = self.string(pos)
+            EntryCount = struct.unpack_from('>I', buf, pos + 8)[0]
+            pos += 12
+            if not name.isprintable() or not DirType.endswith(INLINE_DIR_TYPES) or EntryCount > 0xFFFF:
+                return None
+            types = [DirType]
+            names = [DirName]
+            for x in range(EntryCount):
+                EntryType, pos = self.string(pos)
+                EntryName, pos = self.string(pos)
+                types.append(EntryType)
+                names.append(EntryName)
+        except (ValueError, struct.error, UnicodeDecodeError):
+            return None
+        return start, name, types, names, pos
+
+    def walk(self, dirs, filenames, start, path):
+        # Groups like read_milo_dirs for the directory whose table ends at start and every
+        # directory inlined into it. The only search over the whole milo is the one for .milo names
+        found = self.buf.find(b".milo", start)
+        while found != -1:
+            head = self.head(found + 5)
+            if head is not None:
+                self.heads.append(head)
+            found = self.buf.find(b".milo", found + 5)
+        groups = []
+        self.read_dir(dirs, filenames, start, path, groups)
+        return groups
+
+    def read_dir(self, dirs, filenames, pos, path, groups):
+        # returns where the directory's last entry ends
+        slot = len(groups)
+        groups.append(None)
+        spans = []
+        for x in range(len(dirs)):
+            spans.append(self.piece(pos, path, groups))
+            pos = min(spans[-1][1] + len(ENTRY_END), len(self.buf))
+        view = memoryview(self.buf)
+        groups[slot] = (dirs, filenames, EntrySlices([view[a:b] for a, b in spans], spans), False, path)
+        return pos
+
+    def piece(self, pos, path, groups):
+        # (start, end) of the entry at pos, stepping over the directories inlined into it
+        start = pos
+        while True:
+            end = self.buf.find(ENTRY_END, pos)
+            if end == -1:
+                end = len(self.buf)
+            while self.next_head < len(self.heads) and self.heads[self.next_head][0] < pos:
+                self.next_head += 1
+            if self.next_head == len(self.heads) or self.heads[self.next_head][0] >= end:
+                return start, end
+            head_start, name, types, names, table_end = self.heads[self.next_head]
+            self.next_head += 1
+            pos = self.read_dir(types, names, table_end, path + "/" + name, groups)
+
+def read_milo_dirs(self, f):
+    # (types, names, entries, bone_meshes, path) for each directory table of an opened milo,
+    # path being the directory names down to it joined with /
+    # Seek over magic
+    f.seek(4)
+    # Grab zlib start and block count
+    StartOffset = l_int(f)
+    FileCount = l_int(f)
+    f.seek(16)
+    compressed = []
+    for x in range(FileCount):
+        compressed.append(l_int(f))
+    f.seek(StartOffset)
+    dirs = []
+    filenames = []
+    groups = []
+    if self.little_endian_setting:
+        Version = l_int(f)
+        if Version > 10:
+            DirType = l_numstring(f)
+            DirName = l_numstring(f)
+            dirs.append(DirType)
+            filenames.append(DirName)
+            f.seek(8, 1)
+            EntryCount = l_int(f)
+            for x in range(EntryCount):
+                DirType = l_numstring(f)
+                DirName = l_numstring(f)
+                dirs.append(DirType)
+                filenames.append(DirName)
+        elif Version == 10:
+            EntryCount = l_int(f)
+            for x in range(EntryCount):
+                DirType = l_numstring(f)
+                DirName = l_numstring(f)
+                dirs.append(DirType)
+                filenames.append(DirName)
+            ExtPathCount = l_int(f)
+            for x in range(ExtPathCount):
+                ExtPath = l_numstring(f)
+        files = split_entries(f, f.tell())
+        groups.append((dirs, filenames, files, False, filenames[0] if Version > 10 else ""))
+    else:
+        Version = b_int(f)
+        DirType = b_numstring(f)
+        DirName = b_numstring(f)
+        dirs.append(DirType)
+        filenames.append(DirName)
+        if Version < 32:
+            f.seek(8, 1)
+        else:
+            f.seek(9, 1)
+        EntryCount = b_int(f)
+        for x in range(EntryCount):
+            dirs.append(b_numstring(f))
+            filenames.append(b_numstring(f))
+        if self.venue_setting:
+            groups += InlineDirWalker(f).walk(dirs, filenames, f.tell(), DirName)
+        elif Version < 32:
+            files = split_entries(f, f.tell())
+            min_length = min(len(dirs), len(filenames))
+            if len(files) > min_length:
+                files = files[:min_length]
+            if dirs and filenames and dirs[0] == "ObjectDir":
+                dirs.pop(0)
+                filenames.pop(0)
+            groups.append((dirs, filenames, files, True, DirName))
+    return groups
+
+def read_milos(items):
+    # Yields (settings, entries) per file, in the order of items so builds come out the same every
+    # time. More than one file gets parsed in worker processes while the caller builds the ones before
+    if len(items) < 2 or __name__ == "__main__":
+        # run from the text editor the workers couldn't import this file
+        for item in items:
+            yield item, read_milo(item)
+        return
+    done = set()
+    try:
+        workers = min(len(items), os.cpu_count() or 1)
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = [(pool.submit(read_milo_traced, item), item) for item in items]
+            for future, item in futures:
+                try:
+                    entries, events = future.result()
+                    PROFILE.merge(events)
+                except BrokenProcessPool:
+                    raise
+                except Exception as e:
+                    print(item.filepath, e)
+                    entries = []
+                done.add(item.filepath)
+                yield item, entries
+    except BrokenProcessPool as e:
+        print(e)
+        for item in items:
+            if item.filepath not in done:
+                yield item, read_milo(item)
+
+def build_milo(self, context, entries, collection=None):
+    # collection is where the meshes go, the scene collection when None
+    basename = os.path.basename(self.filepath)
+    materials = MaterialRegistry(self)
+    armature = ArmatureBuilder()
+    meshes = {}
+    targets = lod_collections(self, entries, collection)
+    for kind, data in entries:
+        if data is None:
+            continue
+        if kind == 'mat':
+            materials.add_mat(*data)
+        elif kind == 'tex':
+            materials.add_tex(*data)
+        elif kind == 'mesh':
+            with PROFILE.stage("build mesh", **element_counts(data)) as stage:
+                if build_mesh(self, context, data, basename, materials, meshes, targets.get(data.name, collection)):
+                    stage.add(shared=1)
+        elif kind == 'trans':
+            armature.add(data)
+        elif kind == 'bone':
+            armature.add(data, world=True)
+        elif kind == 'trans_anim':
+            with PROFILE.stage("build animation", **element_counts(data)):
+                build_trans_anim(data)
+        elif kind == 'prop_anim':
+            with PROFILE.stage("build animation", **element_counts(data)):
+                for track in data:
+                    build_prop_anim(track)
+        elif kind == 'char_clip':
+            with PROFILE.stage("build animation", **element_counts(data)):
+                build_char_clip(data)
+    with PROFILE.stage("armature", bones=len(armature.bones)):
+        armature.build()
+    with PROFILE.stage("materials", materials=len(materials.materials)):
+        materials.finish()
+
+LOD_PROP = "hmx_lod"
+
+def layer_collections(layer):
+    yield layer
+    for child in layer.children:
+        yield from layer_collections(child)
+
+def lod_collections(self, entries, parent):
+    # A collection per LOD group, returned as object name -> collection. With low LODs skipped,
+    # the groups past LOD0 stay empty and excluded, with the settings to import them kept on the
+    # collection for load_lods()
+    targets = {}
+    for kind, data in entries:
+        if kind != 'group' or data is None or data.lod is None:
+            continue
+        collection = bpy.data.collections.new(data.name)
+        (bpy.context.scene.collection if parent is None else parent).children.link(collection)
+        if data.lod > 0 and self.low_lod_setting:
+            # read_mesh only skips big endian shadow meshes along with the low LODs, so with
+            # low_lod_setting off for the deferred read they're left out of the names here
+            names = tuple(name for name in data.objects if not (self.shadow_setting and "shadow" in name))
+            settings = dataclasses.replace(self, low_lod_setting=False, profile=False, entry_names=names)
+            collection[LOD_PROP] = json.dumps(dataclasses.asdict(settings))
+            for layer in layer_collections(bpy.context.view_layer.layer_collection):
+                if layer.collection == collection:
+                    layer.exclude = True
+        for name in data.objects:
+            targets.setdefault(name, collection)
+    return targets
+
+def load_lods(*args):
+    # Turning on a deferred LOD collection imports its objects, through the milo's index
+    for layer in list(layer_collections(bpy.context.view_layer.layer_collection)):
+        collection = layer.collection
+        record = collection.get(LOD_PROP)
+        if record is None or layer.exclude or layer.hide_viewport:
+            continue
+        settings = ImportSettings(**json.loads(record))
+        settings.entry_names = tuple(settings.entry_names)
+        try:
+            build_milo(settings, bpy.context, read_milo(settings), collection)
+        except Exception as e:
+            # settings stay on the collection, turning it off and on again retries
+            print(settings.filepath, e)
+            continue
+        del collection[LOD_PROP]
+
+# owner of the msgbus subscriptions, they get dropped on every file load
+LOD_OWNER = object()
+
+def subscribe_lods(*args):
+    bpy.msgbus.clear_by_owner(LOD_OWNER)
+    for prop in ("exclude", "hide_viewport"):
+        bpy.msgbus.subscribe_rna(key=(bpy.types.LayerCollection, prop), owner=LOD_OWNER, args=(), notify=load_lods)
+
 #def CharCollide(self, file):
 # .coll
 # TODO
 #figure out how to read the data
 
-#def Group(self, file):
 # .grp
 # basically just an empty with objects parented to it
 #hh_lod00.grp contains lod00 meshes
 #hh_lod01.grp contains lod01 meshes
 #hh_lod02.grp contains lod02 meshes
+def read_group(self, filename, file):
+    # What comes before the object list changes between versions, but the list itself is a
+    # count and that many names, so the longest run of entry names in there is taken as it
+    endian = '<' if self.little_endian_setting else '>'
+    buf = bytes(file)
+    Objects = []
+    for pos in range(len(buf) - 3):
+        names = name_list(buf, pos, endian)
+        if len(names) > len(Objects):
+            Objects = names
+    match = re.search(r'lod0*(\d+)', filename, re.IGNORECASE)
+    return GroupData(filename, Objects, int(match.group(1)) if match else None)
+
+def name_list(buf, pos, endian):
+    # The names of a count prefixed list of entry names at pos, [] when there isn't one
+    Count = struct.unpack_from(endian + 'I', buf, pos)[0]
+    if Count == 0 or Count * 5 > len(buf) - pos - 4:
+        return []
+    pos += 4
+    names = []
+    for x in range(Count):
+        if pos + 4 > len(buf):
+            return []
+        size = struct.unpack_from(endian + 'I', buf, pos)[0]
+        if size == 0 or size > 0xFF or pos + 4 + size > len(buf):
+            return []
+        try:
+            name = buf[pos + 4:pos + 4 + size].decode('ascii')
+        except UnicodeDecodeError:
+            return []
+        if not name.isprintable() or '.' not in name:
+            return []
+        names.append(name)
+        pos += 4 + size
+    return names
 
 
 #def Light(self, file, name):
 #    f = io.BytesIO(file)
-    Version = b_int(f)
+#    Version = b_int(f)
 #  3 (GH1), 6 (GH2), 9 (GH2 360), 14 (TBRB)
 #    print("light", Version, "name", name)
 #    #f.seek(12)
@@ -1835,16 +2715,134 @@ def CharClipSamples(self, file):
 # .flare
 # greenday rockband only????
 
+# Written next to the folder, one line per finished milo so an interrupted run can pick up again
+MANIFEST_NAME = "hmx_textures.jsonl"
+
+def read_manifest(path):
+    done = {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    done[record["milo"]] = [record["size"], record["mtime_ns"]]
+                except (ValueError, KeyError):
+                    # a line cut short by a killed run
+                    pass
+    except FileNotFoundError:
+        pass
+    return done
+
+def extract_textures(self):
+    # Worker side of main(), returns the names of the textures of one milo that got converted,
+    # that read_tex doesn't handle, and that failed
+    basename = os.path.basename(self.filepath)
+    converted = []
+    skipped = []
+    failed = []
+    with open(self.filepath, 'rb') as f:
+        index = MiloIndex.load(self)
+        if index is not None:
+            groups = index.groups(f, lambda directory, name: "Tex" in directory)
+        else:
+            buf = open_milo(f)
+            groups = read_milo_dirs(self, buf)
+            MiloIndex.build(self, f, buf, groups).save(self)
+        for dirs, filenames, files, bone_meshes, path in groups:
+            for directory, name, file in zip(dirs, filenames, files):
+                if "Tex" not in directory:
+                    continue
+                try:
+                    digest = export_tex(basename, self, name, file)
+                except Exception as e:
+                    print(self.filepath, name, e)
+                    failed.append(name)
+                    continue
+                (converted if digest is not None else skipped).append(name)
+    return converted, skipped, failed
+
+def main(argv=None):
+    # python -m io_import_hmx <folder>: every texture of every milo under the folder to .dds,
+    # written next to its milo like the importer does, without Blender
+    parser = argparse.ArgumentParser(prog="python -m io_import_hmx",
+                                     description="Convert the textures of every milo in a folder to .dds")
+    parser.add_argument("folder")
+    parser.add_argument("--little-endian", action="store_true", help="same as the Little Endian import setting")
+    parser.add_argument("--venue", action="store_true", help="same as the Venue (TBRB) import setting")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--manifest", help="progress file, " + MANIFEST_NAME + " in the folder by default")
+    args = parser.parse_args(argv)
+    manifest = args.manifest or os.path.join(args.folder, MANIFEST_NAME)
+    done = read_manifest(manifest)
+    todo = []
+    skipped = 0
+    for root, dirnames, names in os.walk(args.folder):
+        dirnames.sort()
+        for name in sorted(names):
+            if not name.endswith(MILO_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            st = os.stat(path)
+            key = os.path.relpath(path, args.folder)
+            if done.get(key) == [st.st_size, st.st_mtime_ns]:
+                skipped += 1
+                continue
+            settings = ImportSettings(path, venue_setting=args.venue, little_endian_setting=args.little_endian)
+            todo.append((key, st, settings))
+    print(len(todo), "milos to convert,", skipped, "already done")
+    count = 0
+    failed = 0
+    failed_textures = 0
+    skipped_textures = 0
+    with open(manifest, 'a', encoding='utf-8') as out, \
+            ProcessPoolExecutor(max(1, args.workers), mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = {pool.submit(extract_textures, settings): (key, st) for key, st, settings in todo}
+        for future in as_completed(futures):
+            key, st = futures[future]
+            try:
+                converted, skipped_names, failed_names = future.result()
+            except Exception as e:
+                print(key, e)
+                failed += 1
+                continue
+            count += len(converted)
+            skipped_textures += len(skipped_names)
+            if failed_names:
+                # left out of the manifest so the next run tries this milo again
+                print(key, "failed to convert:", ", ".join(failed_names))
+                failed += 1
+                failed_textures += len(failed_names)
+                continue
+            out.write(json.dumps({"milo": key, "size": st.st_size, "mtime_ns": st.st_mtime_ns,
+                                  "textures": converted, "skipped": skipped_names}) + "\n")
+            out.flush()
+    print(count, "textures converted,", skipped_textures, "not supported,", failed_textures, "textures failed,",
+          failed, "milos failed")
+    return 1 if failed else 0
+
 def menu_func_import(self, context):
     self.layout.operator(ImportMilo.bl_idname, text="Milo Importer")
     
 def register():
+    subscribe_lods()
+    bpy.app.handlers.load_post.append(bpy.app.handlers.persistent(subscribe_lods))
+    bpy.utils.register_class(MiloEntry)
+    bpy.utils.register_class(MILO_UL_entries)
+    bpy.utils.register_class(ImportMiloEntries)
     bpy.utils.register_class(ImportMilo)
     bpy.types.TOPBAR_MT_file_import.append(menu_func_import)
 
 def unregister():
     bpy.utils.unregister_class(ImportMilo)
+    bpy.utils.unregister_class(ImportMiloEntries)
+    bpy.utils.unregister_class(MILO_UL_entries)
+    bpy.utils.unregister_class(MiloEntry)
+    if subscribe_lods in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(subscribe_lods)
+    bpy.msgbus.clear_by_owner(LOD_OWNER)
     bpy.types.TOPBAR_MT_file_import.remove(menu_func_import) 
 
 if __name__ == "__main__":
+    if bpy is None:
+        sys.exit(main())
     register()